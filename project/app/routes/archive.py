@@ -0,0 +1,58 @@
+"""
+Archive routes
+Re-runs field extraction and tax prediction over archived OCR output after rule changes
+"""
+
+from flask import Blueprint, request, jsonify
+import os
+from app.utils.archive_utils import ocr_archive, reextract_jobs
+from app.utils.search_utils import search_index
+
+archive_bp = Blueprint('archive', __name__)
+
+def reindex_result(result_data):
+    """Refresh the search entry of a re-extracted invoice"""
+    try:
+        search_index.add_result(result_data)
+    except Exception as e:
+        print(f"Error indexing result for search: {str(e)}")
+
+@archive_bp.route('/api/archive')
+def api_archive_stats():
+    """API endpoint for archived file counts per OCR version and ruleset version"""
+    return jsonify(ocr_archive.stats())
+
+@archive_bp.route('/api/archive/<path:filename>')
+def api_archive_file(filename):
+    """API endpoint for a file's archived OCR output and its latest (or a given ruleset's) result"""
+    ocr = ocr_archive.get_ocr(filename)
+    if ocr is None:
+        return jsonify({'error': 'File not found in archive'}), 404
+    if request.args.get('boxes', '1') == '0':
+        ocr.pop('boxes')
+    return jsonify({
+        'filename': filename,
+        'ocr': ocr,
+        'result': ocr_archive.get_result(filename, request.args.get('ruleset_version'))
+    })
+
+@archive_bp.route('/api/reextract', methods=['POST'])
+def api_start_reextract():
+    """API endpoint starting a bulk re-extraction (dry_run=1 only reports the diffs)"""
+    dry_run = request.values.get('dry_run', '0') in ('1', 'true', 'yes')
+    workers = request.values.get('workers', type=int)
+    if workers is not None:
+        # Never start more worker processes than there are CPUs
+        workers = min(max(1, workers), os.cpu_count() or 1)
+    job_id = reextract_jobs.start(workers=workers, dry_run=dry_run, on_result=reindex_result)
+    if job_id is None:
+        return jsonify({'error': 'A re-extraction job is already running'}), 409
+    return jsonify({'job_id': job_id, 'status': 'running'}), 202
+
+@archive_bp.route('/api/reextract/<job_id>')
+def api_reextract_status(job_id):
+    """API endpoint for a re-extraction job's progress and diff report"""
+    job = reextract_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
@@ -0,0 +1,34 @@
+"""
+Dashboard routes
+Serves pre-aggregated upload and extraction statistics as JSON
+"""
+
+from flask import Blueprint, request, jsonify
+from app.utils.analytics_utils import analytics_store
+from app.utils.storage_utils import upload_store
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+@dashboard_bp.route('/api/dashboard')
+def api_dashboard_summary():
+    """API endpoint for totals, top vendors, tax categories, failure reasons and OCR latency"""
+    return jsonify(analytics_store.summary())
+
+@dashboard_bp.route('/api/dashboard/daily')
+def api_dashboard_daily():
+    """API endpoint for per-day upload counters"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    return jsonify(analytics_store.daily(days))
+
+@dashboard_bp.route('/api/dashboard/vendors/<path:name>')
+def api_dashboard_vendor(name):
+    """API endpoint for a single vendor's counters"""
+    vendor_stats = analytics_store.vendor(name)
+    if vendor_stats is None:
+        return jsonify({'error': 'Vendor not found'}), 404
+    return jsonify(dict(name=name, **vendor_stats))
+
+@dashboard_bp.route('/api/dashboard/storage')
+def api_dashboard_storage():
+    """API endpoint for upload storage usage and deduplication savings"""
+    return jsonify(upload_store.stats())
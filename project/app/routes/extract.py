@@ -7,6 +7,7 @@ from flask import Blueprint, render_template, request, send_file, flash, redirec
 import os
 import json
 from app.utils.export_utils import create_excel_export, create_json_export
+from app.utils.timing_utils import timed_stage
 
 extract_bp = Blueprint('extract', __name__)
 
@@ -47,12 +48,13 @@ def api_export():
         format_type = data.get('format', 'json')
         invoice_data = data.get('data', {})
         
-        if format_type == 'json':
-            filepath = create_json_export(invoice_data)
-        elif format_type == 'excel':
-            filepath = create_excel_export(invoice_data)
-        else:
-            return jsonify({'error': 'Invalid format'}), 400
+        with timed_stage('export'):
+            if format_type == 'json':
+                filepath = create_json_export(invoice_data)
+            elif format_type == 'excel':
+                filepath = create_excel_export(invoice_data)
+            else:
+                return jsonify({'error': 'Invalid format'}), 400
         
         return send_file(filepath, as_attachment=True)
         
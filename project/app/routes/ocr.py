@@ -3,46 +3,177 @@ OCR processing route
 Handles text extraction from uploaded images and PDFs
 """
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify, Response
 import os
-from app.utils.ocr_utils import extract_text_from_file
-from app.utils.extract_utils import extract_invoice_fields
+import time
+from contextlib import contextmanager
+from app.utils.ocr_utils import extract_ocr_from_file, iter_pdf_pages, ocr_version, PDF_MAX_PAGES, STUB_LATENCY
+from app.utils.extract_utils import extract_invoice_fields, extract_invoice_fields_from_pages
 from app.utils.tax_utils import predict_tax_rates
+from app.utils.scheduler_utils import ocr_scheduler, SchedulerRejected, ANONYMOUS_TENANT
+from app.utils.analytics_utils import analytics_store
+from app.utils.worker_utils import ocr_worker_pool
+from app.utils.storage_utils import upload_store
+from app.utils.search_utils import search_index
+from app.utils.archive_utils import ocr_archive
+from app.utils.timing_utils import timed_stage, record_stage
+from app.utils.result_utils import (
+    result_from_dict, result_to_dict, result_to_compact, encode_json, encode_msgpack
+)
 
 ocr_bp = Blueprint('ocr', __name__)
 
+def get_tenant_id():
+    """Map a configured API key to its tenant; every other client shares the anonymous tenant
+    
+    Unknown keys are not trusted, otherwise rotating header values would earn a fresh quota per request.
+    """
+    api_key = request.headers.get('X-API-Key')
+    if not api_key:
+        return ANONYMOUS_TENANT
+    return current_app.config.get('OCR_API_KEYS', {}).get(api_key, ANONYMOUS_TENANT)
+
+def get_priority_lane():
+    """Bulk clients opt in with an X-Priority header or priority parameter"""
+    priority = request.headers.get('X-Priority') or request.values.get('priority', '')
+    return 'bulk' if priority.lower() == 'bulk' else 'interactive'
+
+@contextmanager
+def stored_upload_path(filename):
+    """Yield a local path for an upload, from the content store or the legacy uploads folder"""
+    if upload_store.exists(filename):
+        with upload_store.materialize(filename) as filepath:
+            yield filepath
+    else:
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"File not found: {filename}")
+        yield filepath
+
+def extract_text_and_fields(filepath):
+    """Run text extraction and field extraction, reading PDFs page by page until the fields are found
+    
+    Returns (ocr, invoice_data) where ocr is {'text', 'boxes', 'version'} as archived for re-extraction.
+    """
+    if filepath.lower().endswith('.pdf'):
+        try:
+            max_pages = current_app.config.get('PDF_MAX_PAGES', PDF_MAX_PAGES)
+            with timed_stage('pdf_text'):
+                invoice_data = extract_invoice_fields_from_pages(iter_pdf_pages(filepath, max_pages))
+            raw_text = invoice_data.get('raw_text', '')
+            
+            # Text layer is good enough, no need for the OCR fallback
+            if len(raw_text.strip()) >= 50:
+                return {'text': raw_text, 'boxes': [], 'version': ocr_version('pdf_text')}, invoice_data
+        
+        except Exception as e:
+            print(f"Error in PDF page extraction: {str(e)}")
+    
+    second_pass = current_app.config.get('OCR_SECOND_PASS', False)
+    with timed_stage('ocr'):
+        if current_app.config.get('OCR_USE_WORKER_PROCESSES', False):
+            # Memory-governed worker processes keep model growth out of the web process
+            ocr = ocr_worker_pool.run(filepath, second_pass)
+        else:
+            ocr = extract_ocr_from_file(filepath, second_pass=second_pass,
+                                        max_pixels=current_app.config.get('OCR_MAX_PIXELS'),
+                                        engine=current_app.config.get('OCR_ENGINE', 'easyocr'),
+                                        stub_latency=current_app.config.get('OCR_STUB_LATENCY', STUB_LATENCY))
+    with timed_stage('extract'):
+        invoice_data = extract_invoice_fields(ocr['text'])
+    return ocr, invoice_data
+
+def process_invoice_file(filepath, filename):
+    """Run OCR, field extraction and tax prediction for a stored file, returning None if no text was found"""
+    started = time.perf_counter()
+    try:
+        ocr, invoice_data = extract_text_and_fields(filepath)
+    except Exception as e:
+        analytics_store.record_failure(f'Processing error: {type(e).__name__}', time.perf_counter() - started)
+        raise
+    ocr_seconds = time.perf_counter() - started
+    raw_text = ocr['text']
+    
+    if not raw_text or len(raw_text.strip()) < 10:
+        analytics_store.record_failure('Insufficient text extracted', ocr_seconds)
+        return None
+    
+    # Predict tax rates for line items
+    with timed_stage('tax'):
+        tax_data = predict_tax_rates(raw_text, invoice_data)
+    
+    # Combine all data
+    result_data = {
+        'filename': filename,
+        'raw_text': raw_text,
+        'invoice_data': invoice_data,
+        'tax_data': tax_data
+    }
+    
+    with timed_stage('analytics'):
+        analytics_store.record_result(result_data, ocr_seconds)
+    
+    # Keep the processed text searchable; indexing problems must not fail the upload
+    try:
+        with timed_stage('index'):
+            search_index.add_result(result_data)
+    except Exception as e:
+        print(f"Error indexing result for search: {str(e)}")
+    
+    # Archive OCR output apart from the result so rule changes can be re-applied without OCR
+    try:
+        with timed_stage('archive'):
+            ocr_archive.put_ocr(filename, ocr)
+            ocr_archive.put_result(filename, result_data)
+    except Exception as e:
+        print(f"Error archiving OCR output: {str(e)}")
+    
+    return result_data
+
+def make_result_response(result_data):
+    """Serialize a result as JSON or MessagePack, nested or compact, optionally without raw_text"""
+    result = result_from_dict(result_data)
+    include_raw_text = request.args.get('raw_text', '1') != '0'
+    
+    if request.args.get('layout') == 'compact':
+        data = result_to_compact(result, include_raw_text)
+    else:
+        data = result_to_dict(result, include_raw_text)
+    
+    if request.args.get('format') == 'msgpack' or 'application/msgpack' in request.headers.get('Accept', ''):
+        try:
+            return Response(encode_msgpack(data), mimetype='application/msgpack')
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 406
+    
+    return Response(encode_json(data), mimetype='application/json')
+
 @ocr_bp.route('/process/<filename>')
 def process_ocr(filename):
     """Process OCR on uploaded file"""
     try:
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        
-        if not os.path.exists(filepath):
-            flash('File not found', 'error')
-            return redirect(url_for('upload.index'))
+        # Extract text using OCR, structured fields and tax data
+        with stored_upload_path(filename) as filepath, \
+                ocr_scheduler.slot(get_tenant_id(), 'interactive',
+                                   timeout=current_app.config.get('OCR_QUEUE_TIMEOUT')) as ticket:
+            record_stage('queue', ticket.wait_seconds)
+            result_data = process_invoice_file(filepath, filename)
         
-        # Extract text using OCR
-        raw_text = extract_text_from_file(filepath)
-        
-        if not raw_text or len(raw_text.strip()) < 10:
+        if result_data is None:
             flash('Could not extract sufficient text from the image. Please try a clearer image.', 'error')
             return redirect(url_for('upload.index'))
         
-        # Extract structured fields
-        invoice_data = extract_invoice_fields(raw_text)
-        
-        # Predict tax rates for line items
-        tax_data = predict_tax_rates(raw_text, invoice_data)
-        
-        # Combine all data
-        result_data = {
-            'filename': filename,
-            'raw_text': raw_text,
-            'invoice_data': invoice_data,
-            'tax_data': tax_data
-        }
-        
-        return render_template('result.html', data=result_data)
+        # Export buttons post the typed result without raw_text to keep the payload small
+        export_data = result_to_dict(result_from_dict(result_data), include_raw_text=False)
+        return render_template('result.html', data=result_data, export_data=export_data)
+    
+    except FileNotFoundError:
+        flash('File not found', 'error')
+        return redirect(url_for('upload.index'))
+    
+    except SchedulerRejected:
+        flash('The server is busy processing other invoices. Please try again shortly.', 'error')
+        return redirect(url_for('upload.index'))
         
     except Exception as e:
         flash(f'Error processing file: {str(e)}', 'error')
@@ -62,29 +193,36 @@ def api_analyze_invoice():
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
-        # Save file to uploads folder
+        # Save file to the upload store (identical content is stored once)
         filename = file.filename
         import time, os
         timestamp = str(int(time.time()))
         name, ext = os.path.splitext(filename)
         filename = f"{name}_{timestamp}{ext}"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        # Extract text using OCR
-        raw_text = extract_text_from_file(filepath)
-        if not raw_text or len(raw_text.strip()) < 10:
+        with timed_stage('store'):
+            upload_store.put(file.stream, filename)
+        # Extract text using OCR, structured fields and tax data
+        with stored_upload_path(filename) as filepath, \
+                ocr_scheduler.slot(get_tenant_id(), get_priority_lane(),
+                                   timeout=current_app.config.get('OCR_QUEUE_TIMEOUT')) as ticket:
+            record_stage('queue', ticket.wait_seconds)
+            result_data = process_invoice_file(filepath, filename)
+        if result_data is None:
             return jsonify({'error': 'Could not extract sufficient text from the file.'}), 400
-        # Extract structured fields
-        invoice_data = extract_invoice_fields(raw_text)
-        # Predict tax rates for line items
-        tax_data = predict_tax_rates(raw_text, invoice_data)
-        # Combine all data
-        result_data = {
-            'filename': filename,
-            'raw_text': raw_text,
-            'invoice_data': invoice_data,
-            'tax_data': tax_data
-        }
-        return jsonify(result_data)
+        with timed_stage('encode'):
+            response = make_result_response(result_data)
+        return response
+    except SchedulerRejected as e:
+        return jsonify({'error': str(e)}), 429
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@ocr_bp.route('/api/scheduler/metrics')
+def api_scheduler_metrics():
+    """API endpoint exposing OCR queue-wait metrics per lane and tenant"""
+    return jsonify(ocr_scheduler.metrics())
+
+@ocr_bp.route('/api/workers/metrics')
+def api_worker_metrics():
+    """API endpoint exposing OCR worker recycling counts and per-job peak memory"""
+    return jsonify(ocr_worker_pool.stats())
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+Reconciliation routes
+Matches processed invoices against purchase registers and GSTR-2B files
+"""
+
+from flask import Blueprint, request, send_file, jsonify
+import json
+from app.utils.reconcile_utils import (
+    load_register, reconcile_all,
+    DEFAULT_AMOUNT_TOLERANCE, DEFAULT_AMOUNT_TOLERANCE_PCT, DEFAULT_DATE_TOLERANCE_DAYS
+)
+from app.utils.export_utils import create_reconciliation_export
+
+reconcile_bp = Blueprint('reconcile', __name__)
+
+REGISTER_FIELDS = ['purchase_register', 'gstr2b']
+
+@reconcile_bp.route('/api/reconcile', methods=['POST'])
+def api_reconcile():
+    """API endpoint reconciling processed invoices against uploaded register files"""
+    try:
+        # Processed results come either as an uploaded JSON file or a form field
+        if 'invoices' in request.files:
+            invoices = json.load(request.files['invoices'])
+        else:
+            invoices = json.loads(request.form.get('invoices', '[]'))
+        
+        if isinstance(invoices, dict):
+            invoices = invoices.get('invoices', [invoices])
+        
+        registers = {}
+        for field in REGISTER_FIELDS:
+            file = request.files.get(field)
+            if file and file.filename:
+                registers[field] = load_register(file, file.filename.rsplit('.', 1)[-1].lower())
+        
+        if not registers:
+            return jsonify({'error': 'Upload a purchase_register and/or gstr2b file'}), 400
+        
+        reports = reconcile_all(
+            invoices,
+            registers,
+            amount_tolerance=float(request.form.get('amount_tolerance', DEFAULT_AMOUNT_TOLERANCE)),
+            amount_tolerance_pct=float(request.form.get('amount_tolerance_pct', DEFAULT_AMOUNT_TOLERANCE_PCT)),
+            date_tolerance_days=int(request.form.get('date_tolerance_days', DEFAULT_DATE_TOLERANCE_DAYS))
+        )
+        
+        if request.form.get('format') == 'excel':
+            filepath = create_reconciliation_export(reports)
+            return send_file(filepath, as_attachment=True, download_name='reconciliation.xlsx')
+        
+        return jsonify(reports)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
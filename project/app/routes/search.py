@@ -0,0 +1,32 @@
+"""
+Search routes
+Full-text and field search over processed invoices
+"""
+
+from flask import Blueprint, request, jsonify
+from app.utils.search_utils import search_index
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/api/search')
+def api_search():
+    """API endpoint for cursor-paginated invoice search with GSTIN, date, amount and tax category filters"""
+    try:
+        results = search_index.search(
+            query=request.args.get('q', ''),
+            gstin=request.args.get('gstin'),
+            vendor=request.args.get('vendor'),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            amount_min=request.args.get('amount_min', type=float),
+            amount_max=request.args.get('amount_max', type=float),
+            category=request.args.get('category'),
+            cursor=request.args.get('cursor'),
+            per_page=request.args.get('per_page', 20, type=int)
+        )
+        return jsonify(results)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -3,11 +3,13 @@ Upload route handler for invoice files
 Handles file upload, validation, and saving
 """
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for
 import os
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import RequestEntityTooLarge
+from app.utils.storage_utils import upload_store
+from app.utils.timing_utils import timed_stage
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -49,8 +51,9 @@ def upload_file():
             name, ext = os.path.splitext(filename)
             filename = f"{name}_{timestamp}{ext}"
             
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            # Identical content is stored once; the name becomes a reference to it
+            with timed_stage('store'):
+                upload_store.put(file.stream, filename)
             
             flash('File uploaded successfully!', 'success')
             return redirect(url_for('ocr.process_ocr', filename=filename))
@@ -0,0 +1,255 @@
+"""
+Dashboard analytics utilities
+Maintains pre-aggregated upload and extraction counters, updated as each result lands
+"""
+
+import copy
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
+
+from app.utils.extract_utils import validate_invoice_data
+
+# Upper bounds (seconds) of the OCR latency histogram buckets
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60]
+
+# Number of vendors kept in the incrementally maintained leaderboard
+TOP_VENDORS = 10
+
+# Minimum seconds between snapshots written to disk
+SAVE_INTERVAL = 5.0
+
+# Vendors tracked individually; past this the long tail with the fewest invoices is pruned
+MAX_VENDORS = 5000
+VENDORS_KEPT_ON_PRUNE = 4000
+
+# Days of per-day counters kept
+DAILY_HISTORY_DAYS = 400
+
+def _empty_stats() -> Dict[str, Any]:
+    return {
+        'totals': {'uploads': 0, 'processed': 0, 'failed': 0, 'valid': 0, 'amount': 0.0, 'tax': 0.0},
+        'daily': {},
+        'vendors': {},
+        'vendors_pruned': 0,
+        'top_vendors': [],
+        'categories': {},
+        'failure_reasons': {},
+        'latency': {
+            'buckets': {_bucket_label(bound): 0 for bound in LATENCY_BUCKETS + [None]},
+            'count': 0,
+            'total_seconds': 0.0,
+            'max_seconds': 0.0
+        }
+    }
+
+def _bucket_label(bound: Optional[float]) -> str:
+    return f'<={bound}s' if bound is not None else f'>{LATENCY_BUCKETS[-1]}s'
+
+class AnalyticsStore:
+    """Counters keyed by day, vendor, tax category, failure reason and latency bucket"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.configure(path)
+
+    def configure(self, path: Optional[str]):
+        """Point the store at a snapshot file and load it if present"""
+        with self._lock:
+            self.path = path
+            self._saved_at = 0.0
+            self._snapshot_seq = 0
+            self._written_seq = 0
+            self._stats = _empty_stats()
+            if path and os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._stats.update(json.load(f))
+                    self._prune_vendors()
+                except Exception as e:
+                    print(f"Error loading analytics snapshot: {str(e)}")
+
+    def _day(self, day: str) -> Dict[str, Any]:
+        daily = self._stats['daily']
+        if day not in daily:
+            # A new day starts: drop counters older than the retained history
+            cutoff = (date.fromisoformat(day) - timedelta(days=DAILY_HISTORY_DAYS)).isoformat()
+            for old_day in [d for d in daily if d < cutoff]:
+                del daily[old_day]
+            daily[day] = {'uploads': 0, 'processed': 0, 'failed': 0, 'amount': 0.0}
+        return daily[day]
+
+    def _prune_vendors(self):
+        """Drop the vendors with the fewest invoices once MAX_VENDORS is exceeded, keeping the leaderboard"""
+        vendors = self._stats['vendors']
+        if len(vendors) <= MAX_VENDORS:
+            return
+        keep = set(heapq.nlargest(VENDORS_KEPT_ON_PRUNE, vendors, key=lambda name: vendors[name]['count']))
+        keep.update(self._stats['top_vendors'])
+        for name in [name for name in vendors if name not in keep]:
+            del vendors[name]
+        self._stats['vendors_pruned'] = self._stats.get('vendors_pruned', 0) + 1
+
+    def _record_latency(self, seconds: float):
+        latency = self._stats['latency']
+        for bound in LATENCY_BUCKETS:
+            if seconds <= bound:
+                latency['buckets'][_bucket_label(bound)] += 1
+                break
+        else:
+            latency['buckets'][_bucket_label(None)] += 1
+        latency['count'] += 1
+        latency['total_seconds'] += seconds
+        latency['max_seconds'] = max(latency['max_seconds'], seconds)
+
+    def _update_top_vendors(self, vendor: str):
+        """Keep the leaderboard sorted by invoice count, touching at most TOP_VENDORS entries"""
+        count = self._stats['vendors'][vendor]['count']
+        top = self._stats['top_vendors']
+        if vendor in top:
+            top.remove(vendor)
+        elif len(top) >= TOP_VENDORS and count <= self._stats['vendors'][top[-1]]['count']:
+            return
+
+        position = len(top)
+        while position > 0 and self._stats['vendors'][top[position - 1]]['count'] < count:
+            position -= 1
+        top.insert(position, vendor)
+        del top[TOP_VENDORS:]
+
+    def record_failure(self, reason: str, ocr_seconds: Optional[float] = None):
+        """Count an upload that produced no usable result"""
+        with self._lock:
+            stats = self._stats
+            day = self._day(date.today().isoformat())
+            stats['totals']['uploads'] += 1
+            stats['totals']['failed'] += 1
+            day['uploads'] += 1
+            day['failed'] += 1
+            stats['failure_reasons'][reason] = stats['failure_reasons'].get(reason, 0) + 1
+            if ocr_seconds is not None:
+                self._record_latency(ocr_seconds)
+            snapshot = self._snapshot_due()
+        self._write_snapshot(snapshot)
+
+    def record_result(self, result_data: Dict[str, Any], ocr_seconds: Optional[float] = None):
+        """Fold one processed result into the aggregates"""
+        invoice_data = result_data.get('invoice_data', {})
+        tax_data = result_data.get('tax_data', {})
+
+        # Validate a shallow copy so the rendered result keeps its original shape
+        validation = validate_invoice_data(dict(invoice_data))
+        amount = float(invoice_data.get('total_amount') or 0)
+        vendor = (invoice_data.get('vendor_name') or 'Unknown').strip()[:100]
+
+        with self._lock:
+            stats = self._stats
+            totals = stats['totals']
+            day = self._day(date.today().isoformat())
+
+            totals['uploads'] += 1
+            totals['processed'] += 1
+            totals['amount'] += amount
+            totals['tax'] += tax_data.get('tax_summary', {}).get('total_tax_amount', 0.0)
+            day['uploads'] += 1
+            day['processed'] += 1
+            day['amount'] += amount
+
+            if validation['is_valid']:
+                totals['valid'] += 1
+            for issue in validation['validation_issues']:
+                stats['failure_reasons'][issue] = stats['failure_reasons'].get(issue, 0) + 1
+
+            vendor_stats = stats['vendors'].setdefault(vendor, {'count': 0, 'amount': 0.0})
+            vendor_stats['count'] += 1
+            vendor_stats['amount'] += amount
+            self._update_top_vendors(vendor)
+            self._prune_vendors()
+
+            for item in tax_data.get('line_items_with_tax', []):
+                category = stats['categories'].setdefault(
+                    item.get('category', 'goods'), {'items': 0, 'taxable_amount': 0.0, 'tax_amount': 0.0})
+                category['items'] += 1
+                category['taxable_amount'] += item.get('amount', 0.0)
+                category['tax_amount'] += item.get('tax_amount', 0.0)
+
+            if ocr_seconds is not None:
+                self._record_latency(ocr_seconds)
+
+            snapshot = self._snapshot_due()
+        self._write_snapshot(snapshot)
+
+    def summary(self) -> Dict[str, Any]:
+        """Dashboard overview; every section is bounded in size, independent of invoice volume"""
+        with self._lock:
+            stats = self._stats
+            latency = stats['latency']
+            return {
+                'totals': dict(stats['totals']),
+                'top_vendors': [
+                    dict(name=vendor, **stats['vendors'][vendor]) for vendor in stats['top_vendors']
+                ],
+                'categories': copy.deepcopy(stats['categories']),
+                'failure_reasons': dict(stats['failure_reasons']),
+                'latency': {
+                    'buckets': dict(latency['buckets']),
+                    'count': latency['count'],
+                    'average_seconds': round(latency['total_seconds'] / latency['count'], 3) if latency['count'] else 0.0,
+                    'max_seconds': round(latency['max_seconds'], 3)
+                }
+            }
+
+    def daily(self, days: int = 30) -> Dict[str, Any]:
+        """Per-day counters for the last N days"""
+        today = date.today()
+        with self._lock:
+            result = {}
+            for offset in range(days - 1, -1, -1):
+                day = (today - timedelta(days=offset)).isoformat()
+                result[day] = dict(self._stats['daily'].get(day, {'uploads': 0, 'processed': 0, 'failed': 0, 'amount': 0.0}))
+            return result
+
+    def vendor(self, name: str) -> Optional[Dict[str, Any]]:
+        """Counters for a single vendor (None if never seen or pruned from the long tail)"""
+        with self._lock:
+            vendor_stats = self._stats['vendors'].get(name)
+            return dict(vendor_stats) if vendor_stats else None
+
+    def _snapshot_due(self, force: bool = False) -> Optional[tuple]:
+        """Copy the aggregates if a snapshot is due (caller holds the lock); the write happens outside it"""
+        if not self.path or (not force and time.monotonic() - self._saved_at < SAVE_INTERVAL):
+            return None
+        self._saved_at = time.monotonic()
+        self._snapshot_seq += 1
+        return self._snapshot_seq, self.path, copy.deepcopy(self._stats)
+
+    def _write_snapshot(self, snapshot: Optional[tuple]):
+        """Write a copy taken by _snapshot_due, skipping it if a newer one is already on disk"""
+        if snapshot is None:
+            return
+        seq, path, stats = snapshot
+        with self._save_lock:
+            if seq <= self._written_seq:
+                return
+            try:
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(stats, f)
+                os.replace(tmp_path, path)
+                self._written_seq = seq
+            except Exception as e:
+                print(f"Error saving analytics snapshot: {str(e)}")
+
+    def flush(self):
+        """Force a snapshot to disk"""
+        with self._lock:
+            snapshot = self._snapshot_due(force=True)
+        self._write_snapshot(snapshot)
+
+# Shared store used by the OCR routes (snapshot path is set from app config in create_app)
+analytics_store = AnalyticsStore()
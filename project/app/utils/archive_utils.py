@@ -0,0 +1,376 @@
+"""
+OCR archive utilities
+Keeps OCR output (text and token boxes) apart from versioned extraction results, and re-runs
+field extraction and tax prediction over the archive when the rules change
+"""
+
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, Callable, Iterator, List
+
+from app.utils import extract_utils, tax_utils
+from app.utils.result_utils import (
+    result_from_dict, result_to_dict, result_to_compact, result_from_compact, TaxSummary
+)
+
+# Archived OCR rows handed to the worker processes per batch
+BATCH_SIZE = 500
+
+# Number of per-invoice diffs kept in a re-extraction report
+DIFF_SAMPLE_SIZE = 50
+
+# Directory holding the app package, where the re-extraction runner is started from
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Compact result keys compared between rulesets (line items and tax are compared per column)
+_DIFF_FIELDS = ['invoice_number', 'invoice_date', 'gstin', 'vendor_name', 'vendor_address', 'total_amount']
+_DIFF_LINE_ITEM_COLUMNS = ['description', 'amount', 'category', 'tax_rate', 'tax_amount']
+_DIFF_TAX_FIELDS = TaxSummary._fields[:-1]
+
+def _ruleset_fingerprint() -> str:
+    """Fingerprint of the extraction and tax rules; any edit to either module yields a new version"""
+    hasher = hashlib.sha256()
+    for module in (extract_utils, tax_utils):
+        with open(module.__file__, 'rb') as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()[:12]
+
+# Version of the rules this process imported; each re-extraction worker computes its own on import,
+# so results are labelled with the rules that actually produced them even if the files change later
+RULESET_VERSION = _ruleset_fingerprint()
+
+def _pack(data: Any) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 6)
+
+def _unpack(payload: Optional[bytes]) -> Any:
+    return json.loads(zlib.decompress(payload).decode('utf-8')) if payload else None
+
+def _compact_result(result_data: Dict[str, Any]) -> Dict[str, Any]:
+    return result_to_compact(result_from_dict(result_data), include_raw_text=False)
+
+def _reextract(item):
+    """Worker: run field extraction and tax prediction on archived text (no OCR), with the worker's ruleset version"""
+    filename, text = item
+    try:
+        invoice_data = extract_utils.extract_invoice_fields(text)
+        tax_data = tax_utils.predict_tax_rates(text, invoice_data)
+        result_data = {'filename': filename, 'raw_text': text, 'invoice_data': invoice_data, 'tax_data': tax_data}
+        return filename, _compact_result(result_data), None, RULESET_VERSION
+    except Exception as e:
+        return filename, None, f'{type(e).__name__}: {str(e)}', RULESET_VERSION
+
+def diff_results(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Field-level differences between two compact results, as {field: {'old', 'new'}}"""
+    changes = {}
+    for field in _DIFF_FIELDS:
+        if old.get(field) != new.get(field):
+            changes[field] = {'old': old.get(field), 'new': new.get(field)}
+
+    old_items, new_items = old.get('line_items', {}), new.get('line_items', {})
+    for column in _DIFF_LINE_ITEM_COLUMNS:
+        if old_items.get(column, []) != new_items.get(column, []):
+            changes[f'line_items.{column}'] = {'old': old_items.get(column, []), 'new': new_items.get(column, [])}
+
+    old_tax, new_tax = old.get('tax', []), new.get('tax', [])
+    for index, field in enumerate(_DIFF_TAX_FIELDS):
+        old_value = old_tax[index] if index < len(old_tax) else None
+        new_value = new_tax[index] if index < len(new_tax) else None
+        if old_value != new_value:
+            changes[f'tax.{field}'] = {'old': old_value, 'new': new_value}
+
+    return changes
+
+class OCRArchive:
+    """OCR output keyed by (filename, OCR version) and results keyed by (filename, ruleset version)"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.path = path
+        if path:
+            self.configure(path)
+
+    def configure(self, path: str):
+        """Open (or create) the archive database"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self.path = path
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS ocr_outputs (
+                    filename TEXT NOT NULL,
+                    ocr_version TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    boxes BLOB,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (filename, ocr_version)
+                );
+                CREATE INDEX IF NOT EXISTS ocr_outputs_latest ON ocr_outputs(filename, created_at);
+
+                CREATE TABLE IF NOT EXISTS results (
+                    filename TEXT NOT NULL,
+                    ruleset_version TEXT NOT NULL,
+                    result BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (filename, ruleset_version)
+                );
+                CREATE INDEX IF NOT EXISTS results_latest ON results(filename, created_at);
+            ''')
+            self._conn.commit()
+
+    def put_ocr(self, filename: str, ocr: Dict[str, Any]):
+        """Store the OCR output for a file (text, token boxes and the version that produced them)"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ocr_outputs VALUES (?, ?, ?, ?, ?)',
+                (filename, ocr['version'], ocr['text'], _pack(ocr.get('boxes') or []), time.time())
+            )
+            self._conn.commit()
+
+    def get_ocr(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Latest OCR output stored for a file"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT ocr_version, text, boxes, created_at FROM ocr_outputs WHERE filename = ? '
+                'ORDER BY created_at DESC LIMIT 1', (filename,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'version': row[0], 'text': row[1], 'boxes': _unpack(row[2]) or [], 'created_at': row[3]}
+
+    def put_result(self, filename: str, result_data: Dict[str, Any], version: Optional[str] = None):
+        """Store the extraction and tax result for a file under a ruleset version"""
+        self._put_compacts([(filename, _compact_result(result_data))], version or RULESET_VERSION)
+
+    def _put_compacts(self, rows: List[tuple], version: str):
+        """Store (filename, compact result) pairs in one transaction"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                [(filename, version, _pack(compact), now) for filename, compact in rows]
+            )
+            self._conn.commit()
+
+    def get_result(self, filename: str, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Compact result for a file, for one ruleset version or the most recent one"""
+        with self._lock:
+            if version:
+                row = self._conn.execute(
+                    'SELECT ruleset_version, result FROM results WHERE filename = ? AND ruleset_version = ?',
+                    (filename, version)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    'SELECT ruleset_version, result FROM results WHERE filename = ? '
+                    'ORDER BY created_at DESC LIMIT 1', (filename,)
+                ).fetchone()
+        if row is None:
+            return None
+        return dict(_unpack(row[1]), ruleset_version=row[0])
+
+    def iter_ocr_batches(self, batch_size: int = BATCH_SIZE) -> Iterator[List[tuple]]:
+        """Yield (filename, text) batches of each file's latest OCR output, in filename order"""
+        last = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT o.filename, o.text FROM ocr_outputs o WHERE o.filename > ? '
+                    'AND o.created_at = (SELECT MAX(created_at) FROM ocr_outputs WHERE filename = o.filename) '
+                    'ORDER BY o.filename LIMIT ?', (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Archived file counts by OCR version and ruleset version"""
+        with self._lock:
+            ocr_versions = dict(self._conn.execute(
+                'SELECT ocr_version, COUNT(*) FROM ocr_outputs GROUP BY ocr_version').fetchall())
+            ruleset_versions = dict(self._conn.execute(
+                'SELECT ruleset_version, COUNT(*) FROM results GROUP BY ruleset_version').fetchall())
+            files = self._conn.execute('SELECT COUNT(DISTINCT filename) FROM ocr_outputs').fetchone()[0]
+        return {
+            'files': files,
+            'ocr_versions': ocr_versions,
+            'ruleset_versions': ruleset_versions,
+            'current_ruleset_version': RULESET_VERSION
+        }
+
+    def reextract(self, workers: Optional[int] = None, dry_run: bool = False,
+                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Re-run field extraction and tax prediction over every archived OCR output in parallel
+
+        Each new result is compared with the file's most recent stored result and, unless dry_run,
+        stored under the ruleset version reported by the worker that produced it (the web process's
+        RULESET_VERSION is kept as ruleset_version in the report). on_result(result_data) is called with
+        the nested result of every new or changed file; on_progress(report) is called after each batch.
+        """
+        workers = workers or os.cpu_count() or 1
+        report = {
+            'ruleset_version': RULESET_VERSION,
+            'worker_ruleset_versions': {},
+            'dry_run': dry_run,
+            'workers': workers,
+            'processed': 0,
+            'changed': 0,
+            'unchanged': 0,
+            'new': 0,
+            'failed': 0,
+            'previous_versions': {},
+            'field_changes': {},
+            'samples': [],
+            'errors': []
+        }
+        started = time.perf_counter()
+
+        # Spawned workers re-import the caller's __main__; ReextractJobs calls this from the small
+        # reextract_runner module so that is all they import, never the web app or the OCR model
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            for batch in self.iter_ocr_batches():
+                chunksize = max(1, len(batch) // (workers * 4))
+                results = executor.map(_reextract, batch, chunksize=chunksize)
+                updated = {}
+                for (filename, text), (_, compact, error, version) in zip(batch, results):
+                    report['processed'] += 1
+                    report['worker_ruleset_versions'][version] = report['worker_ruleset_versions'].get(version, 0) + 1
+                    if error:
+                        report['failed'] += 1
+                        if len(report['errors']) < DIFF_SAMPLE_SIZE:
+                            report['errors'].append({'filename': filename, 'error': error})
+                        continue
+
+                    previous = self.get_result(filename)
+                    if previous is None:
+                        report['new'] += 1
+                        changes = None
+                    else:
+                        previous_version = previous.pop('ruleset_version')
+                        report['previous_versions'][previous_version] = \
+                            report['previous_versions'].get(previous_version, 0) + 1
+                        changes = diff_results(previous, compact)
+                        if not changes:
+                            report['unchanged'] += 1
+                        else:
+                            report['changed'] += 1
+                            for field in changes:
+                                report['field_changes'][field] = report['field_changes'].get(field, 0) + 1
+                            if len(report['samples']) < DIFF_SAMPLE_SIZE:
+                                report['samples'].append({'filename': filename, 'changes': changes})
+
+                    if not dry_run:
+                        updated.setdefault(version, []).append((filename, compact))
+                        if on_result is not None and changes != {}:
+                            on_result(result_to_dict(result_from_compact(dict(compact, raw_text=text))))
+
+                for version, rows in updated.items():
+                    self._put_compacts(rows, version)
+                if on_progress is not None:
+                    on_progress(report)
+
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
+
+def run_reextract_process(path: str, workers: Optional[int] = None, dry_run: bool = False,
+                          on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                          on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Run OCRArchive.reextract in a separate reextract_runner process and relay its events
+
+    The runner reads the archive database itself and streams progress, result and report events
+    back as JSON lines, so on_result and on_progress still run in this process.
+    """
+    command = [sys.executable, '-m', 'app.utils.reextract_runner', os.path.abspath(path)]
+    if workers:
+        command += ['--workers', str(workers)]
+    if dry_run:
+        command.append('--dry-run')
+
+    report = None
+    process = subprocess.Popen(command, cwd=_PROJECT_ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            event = json.loads(line)
+            if event['event'] == 'result' and on_result is not None:
+                on_result(event['data'])
+            elif event['event'] == 'progress' and on_progress is not None:
+                on_progress(event['data'])
+            elif event['event'] == 'report':
+                report = event['data']
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+
+    if returncode != 0 or report is None:
+        raise RuntimeError(f"Re-extraction runner exited with status {returncode}")
+    return report
+
+class ReextractJobs:
+    """Runs one archive re-extraction at a time in a background thread and keeps its report"""
+
+    def __init__(self, archive: OCRArchive):
+        self.archive = archive
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._running = None
+
+    def start(self, workers: Optional[int] = None, dry_run: bool = False,
+              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[str]:
+        """Start a job and return its id, or None if one is already running"""
+        with self._lock:
+            if self._running is not None:
+                return None
+            job_id = uuid.uuid4().hex[:12]
+            job = {'id': job_id, 'status': 'running', 'started_at': time.time(), 'report': {}}
+            self._jobs[job_id] = job
+            self._running = job_id
+
+        def update(report):
+            snapshot = copy.deepcopy(report)
+            with self._lock:
+                job['report'] = snapshot
+
+        def run():
+            try:
+                report = run_reextract_process(self.archive.path, workers, dry_run, on_result, on_progress=update)
+                with self._lock:
+                    job['report'] = report
+                    job['status'] = 'finished'
+            except Exception as e:
+                with self._lock:
+                    job['status'] = 'failed'
+                    job['error'] = str(e)
+                print(f"Error in archive re-extraction: {str(e)}")
+            finally:
+                with self._lock:
+                    job['finished_at'] = time.time()
+                    self._running = None
+
+        threading.Thread(target=run, name=f'reextract-{job_id}', daemon=True).start()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+# Shared archive used by the OCR routes (database path is set from app config in create_app)
+ocr_archive = OCRArchive()
+reextract_jobs = ReextractJobs(ocr_archive)
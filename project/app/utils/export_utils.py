@@ -185,4 +185,54 @@ def cleanup_old_exports(days_old: int = 7):
                     print(f"Cleaned up old export: {filename}")
     
     except Exception as e:
-        print(f"Error cleaning up exports: {str(e)}")
\ No newline at end of file
+        print(f"Error cleaning up exports: {str(e)}")
+
+def create_reconciliation_export(reports: Dict[str, Any]) -> str:
+    """Create Excel reconciliation report with matched, mismatched and missing sheets per source"""
+    try:
+        # Create exports directory if it doesn't exist
+        os.makedirs('exports', exist_ok=True)
+        
+        # Generate filename with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'reconciliation_{timestamp}.xlsx'
+        filepath = os.path.join('exports', filename)
+        
+        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+            
+            # Sheet 1: Summary per source
+            summary_rows = [dict(source=source, **report['summary']) for source, report in reports.items()]
+            pd.DataFrame(summary_rows).to_excel(writer, sheet_name='Summary', index=False)
+            
+            for source, report in reports.items():
+                label = source.replace('_', ' ').title()[:15]
+                
+                for section in ('matched', 'mismatched'):
+                    rows = []
+                    for entry in report[section]:
+                        invoice, register = entry['invoice'], entry['register']
+                        rows.append({
+                            'File': invoice.get('filename', ''),
+                            'GSTIN': invoice['gstin'],
+                            'Invoice Number': invoice['invoice_number'],
+                            'Invoice Date': invoice['invoice_date'],
+                            'Invoice Amount': invoice['amount'],
+                            'Register GSTIN': register['gstin'],
+                            'Register Invoice Number': register['invoice_number'],
+                            'Register Date': register['invoice_date'],
+                            'Register Amount': register['amount'],
+                            'Difference': entry['amount_difference'],
+                            'Match Type': entry['match_type'],
+                            'Mismatched Fields': ', '.join(entry.get('differences', []))
+                        })
+                    pd.DataFrame(rows).to_excel(writer, sheet_name=f'{label} {section.title()}'[:31], index=False)
+                
+                pd.DataFrame(report['missing_in_register']).to_excel(
+                    writer, sheet_name=f'{label} Not In Register'[:31], index=False)
+                pd.DataFrame(report['missing_in_invoices']).to_excel(
+                    writer, sheet_name=f'{label} Not Invoiced'[:31], index=False)
+        
+        return filepath
+    
+    except Exception as e:
+        raise Exception(f"Failed to create reconciliation export: {str(e)}")
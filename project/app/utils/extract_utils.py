@@ -7,75 +7,54 @@ import re
 from datetime import datetime
 import json
 
-def extract_invoice_fields(raw_text):
-    """Extract structured invoice fields from raw OCR text"""
-    if not raw_text:
-        return {}
-    
-    # Initialize result dictionary
-    invoice_data = {
-        'invoice_number': '',
-        'invoice_date': '',
-        'gstin': '',
-        'vendor_name': '',
-        'vendor_address': '',
-        'total_amount': 0.0,
-        'line_items': [],
-        'raw_text': raw_text
-    }
-    
-    # Extract invoice number
-    invoice_patterns = [
-        r'(?:invoice|inv|bill)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
-        r'(?:invoice|inv|bill)\s+([A-Z0-9\-/]{3,})',
-        r'#\s*([A-Z0-9\-/]+)'
-    ]
-    
-    for pattern in invoice_patterns:
-        match = re.search(pattern, raw_text, re.IGNORECASE)
-        if match:
-            invoice_data['invoice_number'] = match.group(1).strip()
-            break
-    
-    # Extract date
-    date_patterns = [
-        r'(?:date|dated)\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'(\d{1,2}\s+\w+\s+\d{2,4})'
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, raw_text, re.IGNORECASE)
+# Header fields that must be present before page-by-page extraction stops parsing headers
+REQUIRED_FIELDS = ['invoice_number', 'invoice_date', 'gstin']
+
+# Maximum number of line items kept per invoice
+MAX_LINE_ITEMS = 20
+
+INVOICE_PATTERNS = [
+    r'(?:invoice|inv|bill)\s*(?:no|number|#)?\s*:?\s*([A-Z0-9\-/]+)',
+    r'(?:invoice|inv|bill)\s+([A-Z0-9\-/]{3,})',
+    r'#\s*([A-Z0-9\-/]+)'
+]
+
+DATE_PATTERNS = [
+    r'(?:date|dated)\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    r'(\d{1,2}\s+\w+\s+\d{2,4})'
+]
+
+GSTIN_PATTERNS = [
+    r'(?:gstin|gst)\s*:?\s*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1})'
+]
+
+AMOUNT_PATTERNS = [
+    r'(?:total|amount|sum)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    r'(?:rs\.?|₹)\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    r'(\d+(?:,\d{3})*(?:\.\d{2})?)(?:\s*(?:rs\.?|₹))',
+]
+
+# An explicitly labelled invoice total (not a subtotal or a bare amount)
+LABELLED_TOTAL_PATTERN = re.compile(
+    r'(?<![\w-])(?<!sub )(?<!sub-)(?:grand\s*total|total\s*amount|amount\s*due|net\s*payable|total)\b'
+    r'\s*:?\s*(?:rs\.?|₹)?\s*\d',
+    re.IGNORECASE
+)
+
+def _first_match(patterns, text):
+    """Return (pattern index, value) for the first pattern matching the text, or (len(patterns), '')"""
+    for index, pattern in enumerate(patterns):
+        match = re.search(pattern, text, re.IGNORECASE)
         if match:
-            date_str = match.group(1).strip()
-            invoice_data['invoice_date'] = normalize_date(date_str)
-            break
-    
-    # Extract GSTIN
-    gstin_pattern = r'(?:gstin|gst)\s*:?\s*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1})'
-    match = re.search(gstin_pattern, raw_text, re.IGNORECASE)
-    if match:
-        invoice_data['gstin'] = match.group(1).strip()
-    
-    # Extract vendor name (usually appears near the top)
-    lines = raw_text.split('\n')[:10]  # Check first 10 lines
-    for line in lines:
-        if len(line.strip()) > 3 and not re.search(r'^\d+|invoice|bill|date', line, re.IGNORECASE):
-            # Skip lines that look like numbers or common invoice terms
-            if not re.search(r'^[\d\s\-/:.]+$', line):
-                invoice_data['vendor_name'] = line.strip()
-                break
-    
-    # Extract total amount
-    amount_patterns = [
-        r'(?:total|amount|sum)\s*:?\s*(?:rs\.?|₹)?\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-        r'(?:rs\.?|₹)\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',
-        r'(\d+(?:,\d{3})*(?:\.\d{2})?)(?:\s*(?:rs\.?|₹))',
-    ]
-    
+            return index, match.group(1).strip()
+    return len(patterns), ''
+
+def _find_amounts(text):
+    """All amounts in a reasonable invoice range found by the amount patterns"""
     amounts = []
-    for pattern in amount_patterns:
-        matches = re.findall(pattern, raw_text, re.IGNORECASE)
+    for pattern in AMOUNT_PATTERNS:
+        matches = re.findall(pattern, text, re.IGNORECASE)
         for match in matches:
             amount_str = match.replace(',', '')
             try:
@@ -84,14 +63,90 @@ def extract_invoice_fields(raw_text):
                     amounts.append(amount)
             except ValueError:
                 continue
+    return amounts
+
+def _find_vendor_name(text):
+    """Vendor name, usually the first meaningful line near the top"""
+    lines = text.split('\n', 10)[:10]  # Check first 10 lines
+    for line in lines:
+        if len(line.strip()) > 3 and not re.search(r'^\d+|invoice|bill|date', line, re.IGNORECASE):
+            # Skip lines that look like numbers or common invoice terms
+            if not re.search(r'^[\d\s\-/:.]+$', line):
+                return line.strip()
+    return ''
+
+def extract_invoice_fields(raw_text):
+    """Extract structured invoice fields from raw OCR text"""
+    if not raw_text:
+        return {}
     
-    if amounts:
-        invoice_data['total_amount'] = max(amounts)  # Take the largest amount as total
+    amounts = _find_amounts(raw_text)
+    date_str = _first_match(DATE_PATTERNS, raw_text)[1]
     
-    # Extract line items (simplified)
-    invoice_data['line_items'] = extract_line_items(raw_text)
+    return {
+        'invoice_number': _first_match(INVOICE_PATTERNS, raw_text)[1],
+        'invoice_date': normalize_date(date_str) if date_str else '',
+        'gstin': _first_match(GSTIN_PATTERNS, raw_text)[1],
+        'vendor_name': _find_vendor_name(raw_text),
+        'vendor_address': '',
+        'total_amount': max(amounts) if amounts else 0.0,  # Take the largest amount as total
+        'line_items': extract_line_items(raw_text),
+        'raw_text': raw_text
+    }
+
+def extract_invoice_fields_from_pages(pages):
+    """Extract invoice fields from (page_number, text, seconds) tuples, parsing each page once
+    
+    Header fields are merged page by page (an earlier pattern beats a later one, then the earlier page).
+    Reading stops at the first page by which the required fields and a labelled total have been found,
+    so the result matches extract_invoice_fields on the text of the pages read up to that point.
+    """
+    header_patterns = {'invoice_number': INVOICE_PATTERNS, 'invoice_date': DATE_PATTERNS, 'gstin': GSTIN_PATTERNS}
+    header = {field: (len(patterns), '') for field, patterns in header_patterns.items()}
+    page_texts = []
+    page_timings = []
+    amounts = []
+    line_items = []
+    labelled_total = False
+    
+    for page_number, text, seconds in pages:
+        page_texts.append(text)
+        page_timings.append({'page': page_number, 'seconds': round(seconds, 4)})
+        amounts.extend(_find_amounts(text))
+        if len(line_items) < MAX_LINE_ITEMS:
+            line_items.extend(extract_line_items(text))
+        
+        labelled_total = labelled_total or bool(LABELLED_TOTAL_PATTERN.search(text))
+        for field, patterns in header_patterns.items():
+            # Only patterns ranked above the current match can still improve it
+            index, value = _first_match(patterns[:header[field][0]], text)
+            if value:
+                header[field] = (index, value)
+        
+        if labelled_total and all(header[field][1] for field in REQUIRED_FIELDS):
+            break
+    
+    # Close the page source so a lazily opened document is released right away
+    if hasattr(pages, 'close'):
+        pages.close()
     
-    return invoice_data
+    raw_text = '\n'.join(page_texts).strip()
+    if not raw_text:
+        return {'pages_scanned': len(page_texts), 'page_timings': page_timings}
+    
+    date_str = header['invoice_date'][1]
+    return {
+        'invoice_number': header['invoice_number'][1],
+        'invoice_date': normalize_date(date_str) if date_str else '',
+        'gstin': header['gstin'][1],
+        'vendor_name': _find_vendor_name(raw_text),
+        'vendor_address': '',
+        'total_amount': max(amounts) if amounts else 0.0,
+        'line_items': line_items[:MAX_LINE_ITEMS],
+        'raw_text': raw_text,
+        'pages_scanned': len(page_texts),
+        'page_timings': page_timings
+    }
 
 def extract_line_items(raw_text):
     """Extract individual line items from invoice text"""
@@ -114,7 +169,7 @@ def extract_line_items(raw_text):
                         'line_text': line.strip()
                     })
     
-    return line_items[:20]  # Limit to 20 items to avoid noise
+    return line_items[:MAX_LINE_ITEMS]  # Limit items to avoid noise
 
 def normalize_date(date_str):
     """Normalize date string to standard format"""
@@ -1,6 +1,6 @@
 """
 OCR utilities for text extraction from images and PDFs
-Uses EasyOCR for image processing and PyPDF2 for PDF text extraction
+Uses EasyOCR for image processing and PyMuPDF/pdfplumber (PyPDF2 fallback) for PDF text extraction
 """
 
 import easyocr
@@ -8,46 +8,240 @@ import cv2
 import numpy as np
 from PIL import Image
 import PyPDF2
+import hashlib
 import os
+import re
+import tempfile
+import time
 
-# Initialize EasyOCR reader (supports English and other languages)
-reader = easyocr.Reader(['en'])
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
 
-def extract_text_from_image(image_path):
-    """Extract text from image using EasyOCR"""
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+# EasyOCR reader (supports English and other languages), loaded on first use so that
+# processes which only hand work to OCR worker processes never hold the model
+_reader = None
+
+def get_reader():
+    """Return the shared EasyOCR reader, creating it on first use"""
+    global _reader
+    if _reader is None:
+        _reader = easyocr.Reader(['en'])
+    return _reader
+
+# Default cap on the number of PDF pages read for a single invoice
+PDF_MAX_PAGES = 50
+
+# Bump when OCR preprocessing or reader settings change, so archived OCR output records what produced it
+OCR_VERSION = 1
+
+# Seconds the stub engine takes per file (OCR_ENGINE='stub', for load testing without the model)
+STUB_LATENCY = 0.5
+
+# Tokens at or below this confidence are dropped from the output
+MIN_CONFIDENCE = 0.5
+
+# Second pass: tokens between these bounds are re-read, labels below need a value beside them
+SECOND_PASS_MIN_CONFIDENCE = 0.1
+SECOND_PASS_MAX_REGIONS = 6
+CRITICAL_LABEL_PATTERN = re.compile(r'\b(?:gstin|gst\s*no|total|grand\s*total|amount\s*due|invoice\s*(?:no|number))\b', re.IGNORECASE)
+
+def read_image_tokens(image_path, second_pass=False, source_path=None):
+    """Run EasyOCR on an image and return [bbox, text, confidence] tokens above MIN_CONFIDENCE
+    
+    Boxes are plain lists of [x, y] points so tokens can be stored as JSON.
+    """
     try:
         # Read image
-        results = reader.readtext(image_path)
+        results = get_reader().readtext(image_path)
         
-        # Combine all detected text
-        extracted_text = []
+        if second_pass and results:
+            results = reocr_weak_regions(source_path or image_path, results)
+        
+        tokens = []
         for (bbox, text, confidence) in results:
-            if confidence > 0.5:  # Filter low-confidence results
-                extracted_text.append(text)
+            if confidence > MIN_CONFIDENCE:  # Filter low-confidence results
+                tokens.append([[[int(x), int(y)] for x, y in bbox], text, round(float(confidence), 4)])
         
-        return '\n'.join(extracted_text)
+        return tokens
     
     except Exception as e:
         print(f"Error in image OCR: {str(e)}")
-        return ""
+        return []
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF file"""
-    try:
+def extract_text_from_image(image_path, second_pass=False, source_path=None):
+    """Extract text from image using EasyOCR, optionally re-reading weak regions"""
+    tokens = read_image_tokens(image_path, second_pass=second_pass, source_path=source_path)
+    return '\n'.join(token[1] for token in tokens)
+
+def _bbox_bounds(bbox):
+    """Convert an EasyOCR quadrilateral into (x_min, y_min, x_max, y_max)"""
+    xs = [point[0] for point in bbox]
+    ys = [point[1] for point in bbox]
+    return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+def find_weak_regions(results, image_width):
+    """Find low-confidence tokens and critical labels whose value is missing
+    
+    Returns (kind, index, bounds) tuples: 'token' regions replace result[index],
+    'value' regions are read to the right of the label at result[index]. Missing critical
+    values come first, then weak tokens holding digits, then the rest, up to SECOND_PASS_MAX_REGIONS.
+    """
+    regions = []
+    
+    for index, (bbox, text, confidence) in enumerate(results):
+        if confidence <= MIN_CONFIDENCE or not CRITICAL_LABEL_PATTERN.search(text):
+            continue
+        # Label already carries its value (e.g. "Total: 1,200.00")
+        if re.search(r'\d{2,}', text):
+            continue
+        
+        x_min, y_min, x_max, y_max = _bbox_bounds(bbox)
+        row_center = (y_min + y_max) / 2
+        has_value = False
+        for other_bbox, other_text, other_confidence in results:
+            ox_min, oy_min, ox_max, oy_max = _bbox_bounds(other_bbox)
+            if (other_confidence > MIN_CONFIDENCE and ox_min >= x_max and oy_min <= row_center <= oy_max
+                    and re.search(r'\d', other_text)):
+                has_value = True
+                break
+        
+        if not has_value:
+            # Read the rest of the row to the right of the label
+            regions.append(('value', index, (x_max, y_min, image_width, y_max)))
+    
+    weak_tokens = [
+        (index, text, confidence, bbox) for index, (bbox, text, confidence) in enumerate(results)
+        if SECOND_PASS_MIN_CONFIDENCE <= confidence <= MIN_CONFIDENCE
+    ]
+    # Amounts, GSTINs and invoice numbers carry digits; among equals, re-read the most promising first
+    weak_tokens.sort(key=lambda token: (not re.search(r'\d', token[1]), -token[2]))
+    for index, text, confidence, bbox in weak_tokens:
+        regions.append(('token', index, _bbox_bounds(bbox)))
+    
+    return regions[:SECOND_PASS_MAX_REGIONS]
+
+def preprocess_region(region):
+    """Heavier preprocessing for a small crop: upscale, sharpen and Otsu threshold"""
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+    scale = 3 if gray.shape[0] < 40 else 2
+    upscaled = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    
+    kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+    sharpened = cv2.filter2D(upscaled, -1, kernel)
+    
+    _, thresh = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+def reocr_weak_regions(image_path, results):
+    """Re-run OCR only on weak regions and merge improved readings into the results"""
+    img = cv2.imread(image_path)
+    if img is None:
+        return results
+    
+    height, width = img.shape[:2]
+    merged = list(results)
+    additions = {}
+    
+    for kind, index, (x_min, y_min, x_max, y_max) in find_weak_regions(results, width):
+        pad = 4
+        crop = img[max(0, y_min - pad):min(height, y_max + pad), max(0, x_min - pad):min(width, x_max + pad)]
+        if crop.size == 0:
+            continue
+        
+        # Alternate decoder settings tuned for short, hard-to-read snippets
+        second = get_reader().readtext(
+            preprocess_region(crop),
+            decoder='beamsearch',
+            beamWidth=10,
+            contrast_ths=0.05,
+            adjust_contrast=0.7,
+            text_threshold=0.5,
+            low_text=0.3
+        )
+        if not second:
+            continue
+        
+        text = ' '.join(item[1] for item in second).strip()
+        confidence = min(item[2] for item in second)
+        if not text:
+            continue
+        
+        if kind == 'token':
+            # Keep the better of the two readings for a weak token
+            if confidence > merged[index][2]:
+                merged[index] = (merged[index][0], text, confidence)
+        elif confidence > MIN_CONFIDENCE:
+            bbox = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+            additions[index] = (bbox, text, confidence)
+    
+    if not additions:
+        return merged
+    
+    # Recovered values go directly after their label so field regexes still see "Total <value>"
+    with_values = []
+    for index, item in enumerate(merged):
+        with_values.append(item)
+        if index in additions:
+            with_values.append(additions[index])
+    
+    return with_values
+
+def iter_pdf_pages(pdf_path, max_pages=PDF_MAX_PAGES):
+    """Lazily yield (page_number, text, seconds) for each page of a PDF text layer"""
+    if fitz is not None:
+        with fitz.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc):
+                if max_pages and page_num >= max_pages:
+                    break
+                started = time.perf_counter()
+                text = page.get_text() or ""
+                yield page_num + 1, text, time.perf_counter() - started
+    
+    elif pdfplumber is not None:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num, page in enumerate(pdf.pages):
+                if max_pages and page_num >= max_pages:
+                    break
+                started = time.perf_counter()
+                text = page.extract_text() or ""
+                # Release the parsed page objects, pdfplumber caches them otherwise
+                page.flush_cache()
+                yield page_num + 1, text, time.perf_counter() - started
+    
+    else:
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+            for page_num, page in enumerate(pdf_reader.pages):
+                if max_pages and page_num >= max_pages:
+                    break
+                started = time.perf_counter()
+                text = page.extract_text() or ""
+                yield page_num + 1, text, time.perf_counter() - started
+
+def extract_text_from_pdf(pdf_path, max_pages=PDF_MAX_PAGES):
+    """Extract text from PDF file"""
+    try:
+        pages = [text for _, text, _ in iter_pdf_pages(pdf_path, max_pages)]
+        return '\n'.join(pages).strip()
     
     except Exception as e:
         print(f"Error in PDF text extraction: {str(e)}")
         return ""
 
+def _private_temp_path(image_path, tag):
+    """Fresh temp file path for a derived image, so jobs reading the same stored object never share one"""
+    ext = os.path.splitext(image_path)[1]
+    fd, path = tempfile.mkstemp(suffix=f'_{tag}{ext}')
+    os.close(fd)
+    return path
+
 def preprocess_image(image_path):
     """Preprocess image for better OCR results"""
     try:
@@ -66,7 +260,7 @@ def preprocess_image(image_path):
         )
         
         # Save preprocessed image temporarily
-        preprocessed_path = image_path.replace('.', '_processed.')
+        preprocessed_path = _private_temp_path(image_path, 'processed')
         cv2.imwrite(preprocessed_path, thresh)
         
         return preprocessed_path
@@ -75,13 +269,86 @@ def preprocess_image(image_path):
         print(f"Error in image preprocessing: {str(e)}")
         return image_path
 
-def extract_text_from_file(file_path):
-    """Main function to extract text from any supported file type"""
+def set_decode_limit(max_pixels):
+    """Tie Pillow's decompression-bomb guard to the OCR pixel budget
+    
+    Pillow warns above MAX_IMAGE_PIXELS and only refuses to open images above twice that, so images
+    of up to four times the budget are still accepted (and downscaled); anything larger is rejected.
+    """
+    if max_pixels:
+        Image.MAX_IMAGE_PIXELS = 2 * max_pixels
+
+def downscale_image(image_path, max_pixels):
+    """Shrink an image above the pixel budget before it is fully decoded, returning the path to OCR"""
+    with Image.open(image_path) as img:
+        width, height = img.size  # Header only, pixels are not decoded yet
+        if width * height <= max_pixels:
+            return image_path
+        
+        scale = (max_pixels / float(width * height)) ** 0.5
+        target = (max(1, int(width * scale)), max(1, int(height * scale)))
+        
+        # JPEG can decode directly at a reduced scale, avoiding the full-size bitmap
+        img.draft('RGB', target)
+        img = img.convert('RGB')
+        img.thumbnail(target, Image.LANCZOS)
+        
+        downscaled_path = _private_temp_path(image_path, 'downscaled')
+        img.save(downscaled_path)
+    
+    return downscaled_path
+
+def ocr_version(engine, second_pass=False):
+    """Version tag stored with OCR output, so archived text from different settings can be told apart"""
+    version = f'{engine}/{OCR_VERSION}'
+    if engine == 'easyocr' and second_pass:
+        version += '/second-pass'
+    return version
+
+def stub_ocr_from_file(file_path, latency=STUB_LATENCY):
+    """Deterministic stand-in for the OCR model: synthetic invoice text derived from the file's bytes
+    
+    Sleeps for a fixed latency, so load tests exercise the web tier, queueing and exports without EasyOCR.
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    seed = int(digest[:8], 16)
+    
+    time.sleep(latency)
+    
+    services = 1000 + seed % 9000
+    goods = 500 + (seed // 10000) % 5000
+    lines = [
+        f'Stub Traders {digest[:4].upper()} Pvt Ltd',
+        f'Invoice No: STUB-{digest[:8].upper()}',
+        f'Date: {1 + seed % 28:02d}/{1 + (seed // 28) % 12:02d}/2024',
+        f'GSTIN: 29ABCDE{seed % 10000:04d}F1Z5',
+        f'Consulting service {services}.00',
+        f'Hardware parts {goods}.00',
+        f'Total: {services + goods}.00'
+    ]
+    boxes = [[[[40, 30 * i], [600, 30 * i], [600, 30 * i + 24], [40, 30 * i + 24]], line, 0.99]
+             for i, line in enumerate(lines, start=1)]
+    return {'text': '\n'.join(lines), 'boxes': boxes, 'version': ocr_version('stub')}
+
+def extract_ocr_from_file(file_path, second_pass=False, max_pixels=None, engine='easyocr',
+                          stub_latency=STUB_LATENCY):
+    """Extract text and token boxes from any supported file type
+    
+    Returns {'text', 'boxes', 'version'}; boxes are empty when the text came from a PDF text layer.
+    engine='stub' replaces OCR with stub_ocr_from_file.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
     file_extension = os.path.splitext(file_path)[1].lower()
     
+    if engine == 'stub' and file_extension in ['.pdf', '.png', '.jpg', '.jpeg']:
+        return stub_ocr_from_file(file_path, stub_latency)
+    
     if file_extension == '.pdf':
         # Extract text from PDF
         text = extract_text_from_pdf(file_path)
@@ -89,26 +356,45 @@ def extract_text_from_file(file_path):
         # If PDF text extraction fails or returns minimal text, try OCR
         if not text or len(text.strip()) < 50:
             # Convert PDF to images and use OCR (simplified approach)
-            text = extract_text_from_image(file_path)
+            tokens = read_image_tokens(file_path)
+            return {
+                'text': '\n'.join(token[1] for token in tokens),
+                'boxes': tokens,
+                'version': ocr_version('easyocr')
+            }
         
-        return text
+        return {'text': text, 'boxes': [], 'version': ocr_version('pdf_text')}
     
     elif file_extension in ['.png', '.jpg', '.jpeg']:
-        # Preprocess image for better OCR
-        processed_path = preprocess_image(file_path)
-        
-        # Extract text using OCR
-        text = extract_text_from_image(processed_path)
-        
-        # Clean up preprocessed image if it was created
-        if processed_path != file_path and os.path.exists(processed_path):
-            os.remove(processed_path)
+        source_path = processed_path = file_path
+        try:
+            # Bound decoded memory for oversized scans
+            source_path = downscale_image(file_path, max_pixels) if max_pixels else file_path
+            
+            # Preprocess image for better OCR
+            processed_path = preprocess_image(source_path)
+            
+            # Extract text using OCR (weak regions are re-read from the original image)
+            tokens = read_image_tokens(processed_path, second_pass=second_pass, source_path=source_path)
+        finally:
+            # Clean up this call's preprocessed and downscaled images if they were created
+            for temp_path in {processed_path, source_path}:
+                if temp_path != file_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
         
-        return text
+        return {
+            'text': '\n'.join(token[1] for token in tokens),
+            'boxes': tokens,
+            'version': ocr_version('easyocr', second_pass)
+        }
     
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
+def extract_text_from_file(file_path, second_pass=False, max_pixels=None):
+    """Main function to extract text from any supported file type"""
+    return extract_ocr_from_file(file_path, second_pass=second_pass, max_pixels=max_pixels)['text']
+
 def clean_extracted_text(text):
     """Clean and normalize extracted text"""
     if not text:
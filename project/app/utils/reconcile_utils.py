@@ -0,0 +1,328 @@
+"""
+Reconciliation utilities
+Matches processed invoices against purchase registers and GSTR-2B downloads using hash-indexed tables
+"""
+
+import json
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
+
+import pandas as pd
+
+from app.utils.extract_utils import normalize_date
+
+# Column names accepted for each canonical field (compared case-insensitively)
+COLUMN_ALIASES = {
+    'gstin': ['gstin', 'ctin', 'supplier_gstin', 'gstin_of_supplier', 'vendor_gstin', 'gst_no'],
+    'invoice_number': ['invoice_number', 'inum', 'invoice_no', 'inv_no', 'bill_no', 'document_number', 'invoice'],
+    'invoice_date': ['invoice_date', 'dt', 'date', 'inv_date', 'bill_date', 'document_date'],
+    'amount': ['amount', 'val', 'total_amount', 'invoice_value', 'total', 'bill_amount', 'grand_total'],
+    'vendor_name': ['vendor_name', 'trdnm', 'supplier_name', 'party_name', 'vendor']
+}
+
+DEFAULT_AMOUNT_TOLERANCE = 1.0       # Absolute rupee difference always accepted
+DEFAULT_AMOUNT_TOLERANCE_PCT = 1.0   # Or this percentage of the register amount
+DEFAULT_DATE_TOLERANCE_DAYS = 3
+
+# Invoice dates repeat heavily across a month's batch, so parse each distinct string once
+_normalize_date = lru_cache(maxsize=4096)(normalize_date)
+
+def normalize_invoice_number(value) -> str:
+    """Uppercase, split into letter/digit runs and drop leading zeros so 'inv/0042' matches 'INV-42'"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    runs = re.findall(r'[A-Z]+|[0-9]+', str(value).upper())
+    # Strip zeros that pad each numeric run; keeping the runs apart stops '2024/042' matching '20242'
+    return '-'.join(run.lstrip('0') or '0' if run.isdigit() else run for run in runs)
+
+def normalize_gstin(value) -> str:
+    """Uppercase GSTIN with whitespace removed"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return re.sub(r'\s+', '', str(value).upper())
+
+def parse_amount(value) -> float:
+    """Parse an amount that may contain currency symbols and thousands separators"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = re.sub(r'[^0-9.\-]', '', str(value))
+    try:
+        return float(cleaned) if cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+@lru_cache(maxsize=4096)
+def _register_date(value) -> str:
+    """YYYY-MM-DD for a register date, or '' when it cannot be parsed
+
+    ISO dates (and Excel's 'YYYY-MM-DD 00:00:00') are read as year-month-day; only the remaining
+    formats fall back to day-first parsing, as Indian registers write dd/mm/yyyy.
+    """
+    text = str(value).strip()
+    if not text:
+        return ''
+    iso = re.match(r'(\d{4}-\d{2}-\d{2})(?:[ T].*)?$', text)
+    if iso:
+        return iso.group(1) if _date_ordinal(iso.group(1)) is not None else ''
+    normalized = _normalize_date(text)
+    if _date_ordinal(normalized) is not None:
+        return normalized
+    parsed = pd.to_datetime(text, dayfirst=True, errors='coerce')
+    return '' if pd.isna(parsed) else parsed.strftime('%Y-%m-%d')
+
+def _flatten_gstr2b(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten the B2B section of a GSTR-2B JSON download into invoice rows"""
+    data = payload.get('data', payload)
+    docdata = data.get('docdata', data)
+    rows = []
+    for supplier in docdata.get('b2b', []):
+        for inv in supplier.get('inv', []):
+            rows.append({
+                'gstin': supplier.get('ctin', ''),
+                'vendor_name': supplier.get('trdnm', ''),
+                'invoice_number': inv.get('inum', ''),
+                'invoice_date': inv.get('dt', ''),
+                'amount': inv.get('val', 0)
+            })
+    return rows
+
+def load_register(source, file_type: Optional[str] = None) -> pd.DataFrame:
+    """Load a purchase register or GSTR-2B file (CSV, JSON or Excel) into canonical columns"""
+    if file_type is None:
+        name = source if isinstance(source, str) else getattr(source, 'filename', '') or ''
+        file_type = os.path.splitext(name)[1].lower().lstrip('.')
+
+    if file_type == 'csv':
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    elif file_type in ('xlsx', 'xls'):
+        df = pd.read_excel(source, dtype=str)
+    elif file_type == 'json':
+        if isinstance(source, str):
+            with open(source, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        else:
+            payload = json.load(source)
+
+        if isinstance(payload, dict) and ('data' in payload or 'docdata' in payload or 'b2b' in payload):
+            df = pd.DataFrame(_flatten_gstr2b(payload))
+        else:
+            df = pd.DataFrame(payload)
+    else:
+        raise ValueError(f"Unsupported register file type: {file_type}")
+
+    # Map known aliases onto canonical column names
+    lookup = {str(col).strip().lower().replace(' ', '_'): col for col in df.columns}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lookup:
+                columns[field] = df[lookup[alias]]
+                break
+        else:
+            columns[field] = pd.Series([''] * len(df), index=df.index)
+
+    canonical = pd.DataFrame(columns).fillna('')
+    canonical['gstin'] = canonical['gstin'].map(normalize_gstin)
+    canonical['invoice_key'] = canonical['invoice_number'].map(normalize_invoice_number)
+    canonical['amount'] = canonical['amount'].map(parse_amount)
+    canonical['invoice_date'] = canonical['invoice_date'].map(_register_date)
+
+    return canonical
+
+class RegisterIndex:
+    """Hash indexes over register rows for exact and fuzzy lookups, consumed rows are removed on take"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = df.to_dict('records')
+        self.by_key = defaultdict(list)       # (gstin, invoice_key) -> positions
+        self.by_gstin = defaultdict(list)     # gstin -> (amount, position) sorted by amount
+        self.by_number = defaultdict(list)    # invoice_key -> (amount, position), catches GSTIN OCR errors
+        self.used = set()
+
+        for position, row in enumerate(self.rows):
+            self.by_key[(row['gstin'], row['invoice_key'])].append(position)
+            if row['gstin']:
+                self.by_gstin[row['gstin']].append((row['amount'], position))
+            if row['invoice_key']:
+                self.by_number[row['invoice_key']].append((row['amount'], position))
+
+        for candidates in self.by_gstin.values():
+            candidates.sort()
+        for candidates in self.by_number.values():
+            candidates.sort()
+
+    def take(self, position: int) -> Dict[str, Any]:
+        row = self.rows[position]
+        self.used.add(position)
+        self.by_key[(row['gstin'], row['invoice_key'])].remove(position)
+        entry = (row['amount'], position)
+        if row['gstin']:
+            _discard(self.by_gstin[row['gstin']], entry)
+        if row['invoice_key']:
+            _discard(self.by_number[row['invoice_key']], entry)
+        return row
+
+    def unmatched_rows(self) -> List[Dict[str, Any]]:
+        return [row for position, row in enumerate(self.rows) if position not in self.used]
+
+def _discard(candidates: List[tuple], entry: tuple):
+    """Remove an (amount, position) entry from an amount-sorted candidate list"""
+    at = bisect_left(candidates, entry)
+    if at < len(candidates) and candidates[at] == entry:
+        del candidates[at]
+
+@lru_cache(maxsize=4096)
+def _date_ordinal(value: str) -> Optional[int]:
+    """Day number of a YYYY-MM-DD date (cached, registers repeat the same dates heavily)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def _date_gap(first: str, second: str) -> Optional[int]:
+    """Days between two YYYY-MM-DD dates, or None when either is unknown"""
+    first_day, second_day = _date_ordinal(first), _date_ordinal(second)
+    if first_day is None or second_day is None:
+        return None
+    return abs(first_day - second_day)
+
+def _amount_ok(invoice_amount: float, register_amount: float, tolerance: float, tolerance_pct: float) -> bool:
+    allowed = max(tolerance, abs(register_amount) * tolerance_pct / 100)
+    return abs(invoice_amount - register_amount) <= allowed
+
+def _compare(invoice: Dict[str, Any], row: Dict[str, Any], tolerance: float, tolerance_pct: float,
+             date_tolerance_days: int) -> List[str]:
+    """Return the list of fields that disagree beyond tolerance"""
+    differences = []
+    if invoice['gstin'] and row['gstin'] and invoice['gstin'] != row['gstin']:
+        differences.append('gstin')
+    if invoice['invoice_key'] != row['invoice_key']:
+        differences.append('invoice_number')
+    if not _amount_ok(invoice['amount'], row['amount'], tolerance, tolerance_pct):
+        differences.append('amount')
+    gap = _date_gap(invoice['invoice_date'], row['invoice_date'])
+    if gap is not None and gap > date_tolerance_days:
+        differences.append('invoice_date')
+    return differences
+
+def _canonical_invoice(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a processed result (or bare invoice_data) into a comparable record"""
+    invoice_data = result.get('invoice_data', result)
+    return {
+        'filename': result.get('filename', ''),
+        'gstin': normalize_gstin(invoice_data.get('gstin', '')),
+        'invoice_number': invoice_data.get('invoice_number', ''),
+        'invoice_key': normalize_invoice_number(invoice_data.get('invoice_number', '')),
+        'invoice_date': _normalize_date(invoice_data.get('invoice_date', '') or ''),
+        'amount': parse_amount(invoice_data.get('total_amount', 0)),
+        'vendor_name': invoice_data.get('vendor_name', '')
+    }
+
+def _amount_window(amount: float, tolerance: float, tolerance_pct: float) -> float:
+    """Largest amount gap _amount_ok can accept for an invoice of this amount"""
+    if tolerance_pct >= 100:
+        return float('inf')
+    return max(tolerance, abs(amount) * tolerance_pct / (100 - tolerance_pct))
+
+def _pick_fuzzy(invoice: Dict[str, Any], index: RegisterIndex, candidates: List[tuple],
+                tolerance: float, tolerance_pct: float, date_tolerance_days: int) -> Optional[int]:
+    """Choose the closest unused candidate by amount, requiring amount (and date if known) to agree"""
+    amount = invoice['amount']
+    window = _amount_window(amount, tolerance, tolerance_pct)
+    # Walk outwards from the invoice amount in order of increasing gap, the first acceptable row is closest
+    right = bisect_left(candidates, (amount, -1))
+    left = right - 1
+    while left >= 0 or right < len(candidates):
+        left_gap = amount - candidates[left][0] if left >= 0 else None
+        right_gap = candidates[right][0] - amount if right < len(candidates) else None
+        if right_gap is None or (left_gap is not None and left_gap <= right_gap):
+            row_amount, position = candidates[left]
+            amount_gap, left = left_gap, left - 1
+        else:
+            row_amount, position = candidates[right]
+            amount_gap, right = right_gap, right + 1
+        if amount_gap > window:
+            break
+        if not _amount_ok(amount, row_amount, tolerance, tolerance_pct):
+            continue
+        gap = _date_gap(invoice['invoice_date'], index.rows[position]['invoice_date'])
+        if gap is not None and gap > date_tolerance_days:
+            continue
+        return position
+    return None
+
+def reconcile_invoices(invoices: List[Dict[str, Any]], register: pd.DataFrame,
+                       amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE,
+                       amount_tolerance_pct: float = DEFAULT_AMOUNT_TOLERANCE_PCT,
+                       date_tolerance_days: int = DEFAULT_DATE_TOLERANCE_DAYS) -> Dict[str, Any]:
+    """Match processed invoices against one register and report matched, mismatched and missing rows"""
+    index = RegisterIndex(register)
+    matched, mismatched, missing_in_register = [], [], []
+
+    for result in invoices:
+        invoice = _canonical_invoice(result)
+        match_type = 'exact'
+
+        # 1. Exact (GSTIN, invoice number) lookup
+        candidates = index.by_key.get((invoice['gstin'], invoice['invoice_key']))
+        position = candidates[0] if candidates else None
+
+        # 2. Same supplier, invoice number misread: match on amount and date
+        if position is None and invoice['gstin']:
+            match_type = 'fuzzy_gstin'
+            position = _pick_fuzzy(invoice, index, index.by_gstin.get(invoice['gstin'], []),
+                                   amount_tolerance, amount_tolerance_pct, date_tolerance_days)
+
+        # 3. Invoice number matches but GSTIN missing or misread
+        if position is None and invoice['invoice_key']:
+            match_type = 'fuzzy_number'
+            position = _pick_fuzzy(invoice, index, index.by_number.get(invoice['invoice_key'], []),
+                                   amount_tolerance, amount_tolerance_pct, date_tolerance_days)
+
+        if position is None:
+            missing_in_register.append(invoice)
+            continue
+
+        row = index.take(position)
+        differences = _compare(invoice, row, amount_tolerance, amount_tolerance_pct, date_tolerance_days)
+        entry = {
+            'invoice': invoice,
+            'register': row,
+            'match_type': match_type,
+            'amount_difference': round(invoice['amount'] - row['amount'], 2)
+        }
+        # Fuzzy matches keep the field they were matched around in differences, so a misread
+        # invoice number or GSTIN is reported as a mismatch rather than a clean match
+        if differences:
+            entry['differences'] = differences
+            mismatched.append(entry)
+        else:
+            matched.append(entry)
+
+    missing_in_invoices = index.unmatched_rows()
+
+    return {
+        'matched': matched,
+        'mismatched': mismatched,
+        'missing_in_register': missing_in_register,
+        'missing_in_invoices': missing_in_invoices,
+        'summary': {
+            'invoices': len(invoices),
+            'register_rows': len(index.rows),
+            'matched': len(matched),
+            'mismatched': len(mismatched),
+            'missing_in_register': len(missing_in_register),
+            'missing_in_invoices': len(missing_in_invoices)
+        }
+    }
+
+def reconcile_all(invoices: List[Dict[str, Any]], registers: Dict[str, pd.DataFrame], **tolerances) -> Dict[str, Any]:
+    """Reconcile the same invoices against several sources (e.g. purchase register and GSTR-2B)"""
+    return {name: reconcile_invoices(invoices, df, **tolerances) for name, df in registers.items()}
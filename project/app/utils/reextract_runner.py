@@ -0,0 +1,38 @@
+"""
+Archive re-extraction runner
+Small entry point that runs OCRArchive.reextract in its own process, so the spawned workers
+re-import this module instead of the web app; events are written to stdout as JSON lines
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from app.utils.archive_utils import OCRArchive
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run field extraction over an OCR archive')
+    parser.add_argument('path', help='Archive database path')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the diffs')
+    args = parser.parse_args()
+
+    # Keep the event stream to ourselves: stray prints here or in the workers go to stderr
+    events = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def emit(event, data):
+        events.write(json.dumps({'event': event, 'data': data}) + '\n')
+        events.flush()
+
+    archive = OCRArchive(args.path)
+    report = archive.reextract(args.workers, args.dry_run,
+                               on_result=lambda result_data: emit('result', result_data),
+                               on_progress=lambda report: emit('progress', report))
+    emit('report', report)
+    events.close()
+
+if __name__ == '__main__':
+    main()
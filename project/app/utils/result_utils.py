@@ -0,0 +1,222 @@
+"""
+Result model utilities
+Compact typed containers for processed invoices with versioned JSON and MessagePack encoding
+"""
+
+import json
+from typing import Dict, Any, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Bump when the compact layout changes; decoders reject versions they do not know
+SCHEMA_VERSION = 1
+
+class LineItem(NamedTuple):
+    """One invoice line merged with its tax prediction"""
+    description: str
+    amount: float
+    line_text: str = ''
+    category: str = ''
+    tax_rate: float = 0.0
+    tax_amount: float = 0.0
+    total_with_tax: float = 0.0
+
+class TaxSummary(NamedTuple):
+    total_taxable_amount: float = 0.0
+    total_tax_amount: float = 0.0
+    cgst: float = 0.0
+    sgst: float = 0.0
+    igst: float = 0.0
+    predicted_total: float = 0.0
+    validation: Optional[Dict[str, Any]] = None
+
+class InvoiceResult(NamedTuple):
+    filename: str
+    invoice_number: str = ''
+    invoice_date: str = ''
+    gstin: str = ''
+    vendor_name: str = ''
+    vendor_address: str = ''
+    total_amount: float = 0.0
+    line_items: Tuple[LineItem, ...] = ()
+    tax: TaxSummary = TaxSummary()
+    raw_text: str = ''
+    extras: Optional[Dict[str, Any]] = None
+
+# Keys of invoice_data that are modelled explicitly (everything else goes into extras)
+_INVOICE_FIELDS = {'invoice_number', 'invoice_date', 'gstin', 'vendor_name', 'vendor_address',
+                   'total_amount', 'line_items', 'raw_text'}
+
+# Column order of line items in the compact layout
+_LINE_ITEM_COLUMNS = LineItem._fields
+
+def result_from_dict(result_data: Dict[str, Any]) -> InvoiceResult:
+    """Build an InvoiceResult from the nested dicts produced by the OCR routes"""
+    invoice_data = result_data.get('invoice_data', {})
+    tax_data = result_data.get('tax_data', {})
+    tax_summary = tax_data.get('tax_summary', {})
+    breakdown = tax_summary.get('tax_breakdown', {})
+
+    # predict_tax_rates emits one taxed entry per extracted line item, in the same order
+    taxed_items = tax_data.get('line_items_with_tax', [])
+    line_items = []
+    for index, item in enumerate(invoice_data.get('line_items', [])):
+        taxed = taxed_items[index] if index < len(taxed_items) else {}
+        line_items.append(LineItem(
+            description=item.get('description', ''),
+            amount=float(item.get('amount', 0.0)),
+            line_text=item.get('line_text', ''),
+            category=taxed.get('category', ''),
+            tax_rate=float(taxed.get('tax_rate', 0.0)),
+            tax_amount=float(taxed.get('tax_amount', 0.0)),
+            total_with_tax=float(taxed.get('total_with_tax', 0.0))
+        ))
+
+    extras = {key: value for key, value in invoice_data.items() if key not in _INVOICE_FIELDS}
+
+    return InvoiceResult(
+        filename=result_data.get('filename', ''),
+        invoice_number=invoice_data.get('invoice_number', ''),
+        invoice_date=invoice_data.get('invoice_date', ''),
+        gstin=invoice_data.get('gstin', ''),
+        vendor_name=invoice_data.get('vendor_name', ''),
+        vendor_address=invoice_data.get('vendor_address', ''),
+        total_amount=float(invoice_data.get('total_amount', 0.0)),
+        line_items=tuple(line_items),
+        tax=TaxSummary(
+            total_taxable_amount=tax_summary.get('total_taxable_amount', 0.0),
+            total_tax_amount=tax_summary.get('total_tax_amount', 0.0),
+            cgst=breakdown.get('cgst', 0.0),
+            sgst=breakdown.get('sgst', 0.0),
+            igst=breakdown.get('igst', 0.0),
+            predicted_total=tax_data.get('predicted_total', 0.0),
+            validation=tax_data.get('validation')
+        ),
+        raw_text=result_data.get('raw_text') or invoice_data.get('raw_text', ''),
+        extras=extras or None
+    )
+
+def result_to_dict(result: InvoiceResult, include_raw_text: bool = True) -> Dict[str, Any]:
+    """Nested dict layout used by templates, exports and existing API clients (raw_text only at top level)"""
+    tax_data = {
+        'line_items_with_tax': [
+            {
+                'description': item.description,
+                'amount': item.amount,
+                'category': item.category,
+                'tax_rate': item.tax_rate,
+                'tax_amount': item.tax_amount,
+                'total_with_tax': item.total_with_tax,
+                'original_line': item.line_text
+            }
+            for item in result.line_items
+        ],
+        'tax_summary': {
+            'total_taxable_amount': result.tax.total_taxable_amount,
+            'total_tax_amount': result.tax.total_tax_amount,
+            'tax_breakdown': {'cgst': result.tax.cgst, 'sgst': result.tax.sgst, 'igst': result.tax.igst}
+        },
+        'predicted_total': result.tax.predicted_total
+    }
+    if result.tax.validation is not None:
+        tax_data['validation'] = result.tax.validation
+
+    invoice_data = {
+        'invoice_number': result.invoice_number,
+        'invoice_date': result.invoice_date,
+        'gstin': result.gstin,
+        'vendor_name': result.vendor_name,
+        'vendor_address': result.vendor_address,
+        'total_amount': result.total_amount,
+        'line_items': [
+            {'description': item.description, 'amount': item.amount, 'line_text': item.line_text}
+            for item in result.line_items
+        ]
+    }
+    if result.extras:
+        invoice_data.update(result.extras)
+
+    data = {
+        'schema_version': SCHEMA_VERSION,
+        'filename': result.filename,
+        'invoice_data': invoice_data,
+        'tax_data': tax_data
+    }
+    if include_raw_text:
+        data['raw_text'] = result.raw_text
+    return data
+
+def result_to_compact(result: InvoiceResult, include_raw_text: bool = True) -> Dict[str, Any]:
+    """Flat, versioned layout with line items stored column-wise"""
+    columns = {name: [] for name in _LINE_ITEM_COLUMNS}
+    for item in result.line_items:
+        for name, value in zip(_LINE_ITEM_COLUMNS, item):
+            columns[name].append(value)
+
+    data = {
+        'schema_version': SCHEMA_VERSION,
+        'filename': result.filename,
+        'invoice_number': result.invoice_number,
+        'invoice_date': result.invoice_date,
+        'gstin': result.gstin,
+        'vendor_name': result.vendor_name,
+        'vendor_address': result.vendor_address,
+        'total_amount': result.total_amount,
+        'line_items': columns,
+        'tax': list(result.tax[:-1]),
+        'validation': result.tax.validation,
+        'extras': result.extras
+    }
+    if include_raw_text:
+        data['raw_text'] = result.raw_text
+    return data
+
+def result_from_compact(data: Dict[str, Any]) -> InvoiceResult:
+    """Inverse of result_to_compact"""
+    version = data.get('schema_version')
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported result schema version: {version}")
+
+    columns = data.get('line_items', {})
+    rows = zip(*(columns.get(name, []) for name in _LINE_ITEM_COLUMNS))
+    line_items = tuple(LineItem(*row) for row in rows)
+
+    return InvoiceResult(
+        filename=data.get('filename', ''),
+        invoice_number=data.get('invoice_number', ''),
+        invoice_date=data.get('invoice_date', ''),
+        gstin=data.get('gstin', ''),
+        vendor_name=data.get('vendor_name', ''),
+        vendor_address=data.get('vendor_address', ''),
+        total_amount=data.get('total_amount', 0.0),
+        line_items=line_items,
+        tax=TaxSummary(*data.get('tax', []), validation=data.get('validation')),
+        raw_text=data.get('raw_text', ''),
+        extras=data.get('extras')
+    )
+
+def encode_json(data: Any) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def encode_msgpack(data: Any) -> bytes:
+    """Serialize to MessagePack bytes"""
+    if msgpack is None:
+        raise RuntimeError("MessagePack support requires the msgpack package")
+    return msgpack.packb(data, use_bin_type=True)
+
+def decode_msgpack(payload: bytes) -> Any:
+    """Deserialize MessagePack bytes"""
+    if msgpack is None:
+        raise RuntimeError("MessagePack support requires the msgpack package")
+    return msgpack.unpackb(payload, raw=False)
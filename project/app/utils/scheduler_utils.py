@@ -0,0 +1,278 @@
+"""
+Fair scheduling utilities for OCR work
+Implements weighted fair queuing across tenants with interactive and bulk priority lanes
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+LANES = ['interactive', 'bulk']
+
+# Shared tenant for every client without a configured API key
+ANONYMOUS_TENANT = 'anonymous'
+
+# Number of recent queue-wait samples kept per lane for percentile metrics
+WAIT_SAMPLE_SIZE = 1000
+
+class SchedulerRejected(Exception):
+    """Raised when a job cannot be admitted (queue full, timed out waiting)"""
+
+class _Ticket:
+    __slots__ = ('tenant', 'lane', 'finish_tag', 'enqueued_at', 'granted', 'wait_seconds')
+
+    def __init__(self, tenant: str, lane: str, finish_tag: float):
+        self.tenant = tenant
+        self.lane = lane
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.wait_seconds = 0.0
+
+class _TenantState:
+    def __init__(self, weight: float, concurrency: int, rate: Optional[float], burst: float):
+        self.weight = weight
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.queues = {lane: deque() for lane in LANES}
+        self.last_finish = {lane: 0.0 for lane in LANES}
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def is_idle(self) -> bool:
+        """Nothing queued or running and the token bucket full, so dropping the state loses nothing"""
+        return (self.active == 0
+                and not any(self.queues.values())
+                and (self.rate is None or self.tokens >= self.burst))
+
+    def refill(self, now: float):
+        """Top up the rate-limit token bucket"""
+        if self.rate is None:
+            return
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def can_start(self) -> bool:
+        """Check per-tenant concurrency and rate limits"""
+        if self.active >= self.concurrency:
+            return False
+        return self.rate is None or self.tokens >= 1.0
+
+class FairScheduler:
+    """Admit OCR jobs fairly across tenants, keeping capacity reserved for interactive uploads"""
+
+    def __init__(self, max_workers: int = 2, interactive_reserved: int = 1,
+                 tenant_concurrency: int = 1, tenant_rate: Optional[float] = None,
+                 tenant_burst: float = 5.0, max_queue_per_tenant: int = 500,
+                 tenant_weights: Optional[Dict[str, float]] = None,
+                 tenant_concurrency_overrides: Optional[Dict[str, int]] = None):
+        self._cond = threading.Condition()
+        self._tenants: Dict[str, _TenantState] = {}
+        self._virtual_time = {lane: 0.0 for lane in LANES}
+        self._active = {lane: 0 for lane in LANES}
+        self._waits = {lane: deque(maxlen=WAIT_SAMPLE_SIZE) for lane in LANES}
+        self._totals = {'completed': 0, 'rejected': 0, 'evicted_tenants': 0}
+        self.configure(max_workers, interactive_reserved, tenant_concurrency, tenant_rate, tenant_burst,
+                       max_queue_per_tenant, tenant_weights, tenant_concurrency_overrides)
+
+    def configure(self, max_workers: int = 2, interactive_reserved: int = 1,
+                  tenant_concurrency: int = 1, tenant_rate: Optional[float] = None,
+                  tenant_burst: float = 5.0, max_queue_per_tenant: int = 500,
+                  tenant_weights: Optional[Dict[str, float]] = None,
+                  tenant_concurrency_overrides: Optional[Dict[str, int]] = None):
+        """Update scheduler limits and apply them to known tenants
+        
+        tenant_concurrency_overrides gives specific tenants (e.g. the shared anonymous tenant)
+        a concurrency other than tenant_concurrency.
+        """
+        with self._cond:
+            self.max_workers = max(1, max_workers)
+            self.interactive_reserved = min(max(0, interactive_reserved), self.max_workers - 1)
+            self.tenant_concurrency = max(1, tenant_concurrency)
+            self.tenant_rate = tenant_rate
+            self.tenant_burst = max(1.0, tenant_burst)
+            self.max_queue_per_tenant = max_queue_per_tenant
+            self.tenant_weights = dict(tenant_weights or {})
+            self.tenant_concurrency_overrides = dict(tenant_concurrency_overrides or {})
+            for tenant, state in self._tenants.items():
+                state.weight = self.tenant_weights.get(tenant, 1.0)
+                state.concurrency = self._concurrency_for(tenant)
+                state.rate = self.tenant_rate
+                state.burst = self.tenant_burst
+            self._cond.notify_all()
+
+    def _concurrency_for(self, tenant: str) -> int:
+        return max(1, self.tenant_concurrency_overrides.get(tenant, self.tenant_concurrency))
+
+    def _tenant(self, tenant: str) -> _TenantState:
+        state = self._tenants.get(tenant)
+        if state is None:
+            state = _TenantState(self.tenant_weights.get(tenant, 1.0), self._concurrency_for(tenant),
+                                 self.tenant_rate, self.tenant_burst)
+            self._tenants[tenant] = state
+        return state
+
+    def _lane_has_capacity(self, lane: str) -> bool:
+        total_active = sum(self._active.values())
+        if total_active >= self.max_workers:
+            return False
+        if lane == 'bulk':
+            # Bulk work never takes the slots reserved for interactive uploads
+            return self._active['bulk'] < self.max_workers - self.interactive_reserved
+        return True
+
+    def _dispatch(self):
+        """Grant queued tickets while capacity allows (caller holds the lock)"""
+        now = time.monotonic()
+        idle = []
+        for tenant, state in self._tenants.items():
+            state.refill(now)
+            # Idle tenants are dropped so the table only holds tenants with work or a spent rate budget;
+            # a tenant that is still ahead in virtual time keeps its state so it cannot jump the queue
+            if state.is_idle() and all(state.last_finish[lane] <= self._virtual_time[lane] for lane in LANES):
+                idle.append(tenant)
+        for tenant in idle:
+            del self._tenants[tenant]
+        self._totals['evicted_tenants'] += len(idle)
+
+        granted = False
+        for lane in LANES:
+            while self._lane_has_capacity(lane):
+                best = None
+                for state in self._tenants.values():
+                    queue = state.queues[lane]
+                    if queue and state.can_start():
+                        if best is None or queue[0].finish_tag < best.queues[lane][0].finish_tag:
+                            best = state
+                if best is None:
+                    break
+
+                ticket = best.queues[lane].popleft()
+                ticket.granted = True
+                ticket.wait_seconds = now - ticket.enqueued_at
+                best.active += 1
+                if best.rate is not None:
+                    best.tokens -= 1.0
+                self._active[lane] += 1
+                self._virtual_time[lane] = max(self._virtual_time[lane], ticket.finish_tag)
+                self._waits[lane].append(ticket.wait_seconds)
+                granted = True
+
+        if granted:
+            self._cond.notify_all()
+
+    def _next_wakeup(self) -> Optional[float]:
+        """Seconds until a rate-limited tenant earns its next token, if any are waiting"""
+        delays = [
+            (1.0 - state.tokens) / state.rate
+            for state in self._tenants.values()
+            if state.rate and state.tokens < 1.0 and any(state.queues.values())
+        ]
+        return max(min(delays), 0.001) if delays else None
+
+    def acquire(self, tenant: str, lane: str = 'interactive', cost: float = 1.0,
+                timeout: Optional[float] = None) -> _Ticket:
+        """Queue a job and block until it is allowed to run"""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            state = self._tenant(tenant)
+            if sum(len(q) for q in state.queues.values()) >= self.max_queue_per_tenant:
+                state.rejected += 1
+                self._totals['rejected'] += 1
+                raise SchedulerRejected(f"Too many queued jobs for {tenant}")
+
+            start_tag = max(self._virtual_time[lane], state.last_finish[lane])
+            ticket = _Ticket(tenant, lane, start_tag + cost / state.weight)
+            state.last_finish[lane] = ticket.finish_tag
+            state.queues[lane].append(ticket)
+            self._dispatch()
+
+            while not ticket.granted:
+                wait_for = self._next_wakeup()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.queues[lane].remove(ticket)
+                        state.rejected += 1
+                        self._totals['rejected'] += 1
+                        raise SchedulerRejected(f"Timed out waiting for an OCR worker for {tenant}")
+                    wait_for = remaining if wait_for is None else min(wait_for, remaining)
+                self._cond.wait(wait_for)
+                if not ticket.granted:
+                    self._dispatch()
+
+            return ticket
+
+    def release(self, ticket: _Ticket):
+        """Mark a granted job as finished and hand its slot to the next ticket"""
+        with self._cond:
+            state = self._tenants.get(ticket.tenant)
+            if state is not None:
+                state.active -= 1
+                state.completed += 1
+            self._totals['completed'] += 1
+            self._active[ticket.lane] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tenant: str, lane: str = 'interactive', cost: float = 1.0,
+             timeout: Optional[float] = None):
+        """Context manager wrapping acquire/release around a unit of OCR work"""
+        ticket = self.acquire(tenant, lane, cost, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue-wait percentiles per lane and per-tenant counters"""
+        with self._cond:
+            lanes = {}
+            for lane in LANES:
+                waits = sorted(self._waits[lane])
+                lanes[lane] = {
+                    'active': self._active[lane],
+                    'queued': sum(len(s.queues[lane]) for s in self._tenants.values()),
+                    'wait_p50': _percentile(waits, 50),
+                    'wait_p95': _percentile(waits, 95),
+                    'wait_max': round(waits[-1], 4) if waits else 0.0,
+                    'samples': len(waits)
+                }
+
+            tenants = {
+                tenant: {
+                    'weight': state.weight,
+                    'active': state.active,
+                    'queued': {lane: len(state.queues[lane]) for lane in LANES},
+                    'completed': state.completed,
+                    'rejected': state.rejected
+                }
+                for tenant, state in self._tenants.items()
+            }
+
+            return {
+                'max_workers': self.max_workers,
+                'interactive_reserved': self.interactive_reserved,
+                'totals': dict(self._totals),
+                'lanes': lanes,
+                'tenants': tenants
+            }
+
+def _percentile(sorted_values, percent: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return round(sorted_values[index], 4)
+
+# Shared scheduler used by the OCR routes (limits are set from app config in create_app)
+ocr_scheduler = FairScheduler()
@@ -0,0 +1,296 @@
+"""
+Search utilities
+Indexes processed invoices in SQLite (FTS5 for text, B-tree indexes for field filters)
+"""
+
+import base64
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from app.utils.extract_utils import normalize_date
+
+MAX_PER_PAGE = 100
+
+class SearchIndex:
+    """Full-text and field search over processed invoice results"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.path = path
+        if path:
+            self.configure(path)
+
+    def configure(self, path: str):
+        """Open (or create) the index database"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self.path = path
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS invoices (
+                    id INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    invoice_number TEXT,
+                    invoice_date TEXT,
+                    invoice_day TEXT,
+                    gstin TEXT,
+                    vendor_name TEXT,
+                    total_amount REAL,
+                    predicted_total REAL,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS invoices_amount ON invoices(total_amount);
+                CREATE INDEX IF NOT EXISTS invoices_filename ON invoices(filename);
+
+                CREATE TABLE IF NOT EXISTS invoice_categories (
+                    category TEXT NOT NULL,
+                    invoice_id INTEGER NOT NULL,
+                    PRIMARY KEY (category, invoice_id)
+                ) WITHOUT ROWID;
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5(
+                    raw_text, line_items, fields, tokenize = 'unicode61'
+                );
+            ''')
+            self._migrate_invoice_day()
+            self._conn.executescript('''
+                DROP INDEX IF EXISTS invoices_gstin_date;
+                DROP INDEX IF EXISTS invoices_date;
+                CREATE INDEX IF NOT EXISTS invoices_gstin_day ON invoices(gstin, invoice_day, id);
+                CREATE INDEX IF NOT EXISTS invoices_day ON invoices(invoice_day, id);
+            ''')
+            self._conn.commit()
+
+    def _migrate_invoice_day(self):
+        """Add and backfill the ISO invoice_day column on indexes created before it existed (caller holds the lock)"""
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(invoices)')}
+        if 'invoice_day' in columns:
+            return
+        self._conn.execute('ALTER TABLE invoices ADD COLUMN invoice_day TEXT')
+        rows = self._conn.execute('SELECT id, invoice_date FROM invoices').fetchall()
+        self._conn.executemany(
+            'UPDATE invoices SET invoice_day = ? WHERE id = ?',
+            [(_iso_date(row['invoice_date']), row['id']) for row in rows]
+        )
+
+    def add_result(self, result_data: Dict[str, Any]) -> int:
+        """Index one processed result, replacing any earlier entry for the same file"""
+        invoice_data = result_data.get('invoice_data', {})
+        tax_data = result_data.get('tax_data', {})
+        filename = result_data.get('filename', '')
+
+        line_items = invoice_data.get('line_items', [])
+        categories = {item.get('category') for item in tax_data.get('line_items_with_tax', []) if item.get('category')}
+        fields = ' '.join(str(invoice_data.get(key) or '') for key in
+                          ('invoice_number', 'vendor_name', 'vendor_address', 'gstin'))
+
+        with self._lock:
+            self._delete_filename(filename)
+            cursor = self._conn.execute(
+                'INSERT INTO invoices (filename, invoice_number, invoice_date, invoice_day, gstin, vendor_name, '
+                'total_amount, predicted_total, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    filename,
+                    invoice_data.get('invoice_number', ''),
+                    invoice_data.get('invoice_date', ''),
+                    _iso_date(invoice_data.get('invoice_date')),
+                    (invoice_data.get('gstin') or '').upper(),
+                    invoice_data.get('vendor_name', ''),
+                    float(invoice_data.get('total_amount') or 0),
+                    float(tax_data.get('predicted_total') or 0),
+                    time.time()
+                )
+            )
+            invoice_id = cursor.lastrowid
+            self._conn.execute(
+                'INSERT INTO invoices_fts (rowid, raw_text, line_items, fields) VALUES (?, ?, ?, ?)',
+                (
+                    invoice_id,
+                    result_data.get('raw_text') or invoice_data.get('raw_text', ''),
+                    '\n'.join(item.get('description', '') for item in line_items),
+                    fields
+                )
+            )
+            self._conn.executemany(
+                'INSERT INTO invoice_categories (category, invoice_id) VALUES (?, ?)',
+                [(category, invoice_id) for category in categories]
+            )
+            self._conn.commit()
+        return invoice_id
+
+    def _delete_filename(self, filename: str):
+        """Remove index entries for a file (caller holds the lock)"""
+        rows = self._conn.execute('SELECT id FROM invoices WHERE filename = ?', (filename,)).fetchall()
+        for row in rows:
+            self._conn.execute('DELETE FROM invoices_fts WHERE rowid = ?', (row['id'],))
+            self._conn.execute('DELETE FROM invoice_categories WHERE invoice_id = ?', (row['id'],))
+            self._conn.execute('DELETE FROM invoices WHERE id = ?', (row['id'],))
+
+    def search(self, query: str = '', gstin: Optional[str] = None, vendor: Optional[str] = None,
+               date_from: Optional[str] = None, date_to: Optional[str] = None,
+               amount_min: Optional[float] = None, amount_max: Optional[float] = None,
+               category: Optional[str] = None, cursor: Optional[str] = None, per_page: int = 20) -> Dict[str, Any]:
+        """Search invoices by text and field filters, newest first unless ranked by text relevance
+
+        Pages are keyset based: pass the returned next_cursor to continue after the last row.
+        """
+        per_page = min(max(1, per_page), MAX_PER_PAGE)
+        after = _decode_cursor(cursor)
+
+        joins, join_params, where, params = [], [], [], []
+        select_snippet = "'' AS snippet"
+
+        match = _fts_query(query)
+        if match:
+            joins.append('JOIN invoices_fts f ON f.rowid = i.id')
+            where.append('invoices_fts MATCH ?')
+            params.append(match)
+            select_snippet = "snippet(invoices_fts, -1, '[', ']', '...', 12) AS snippet, f.rank AS rank"
+
+        if category:
+            joins.append('JOIN invoice_categories c ON c.invoice_id = i.id AND c.category = ?')
+            join_params.append(category)
+        if gstin:
+            where.append('i.gstin = ?')
+            params.append(gstin.upper())
+        if vendor:
+            where.append('i.vendor_name LIKE ?')
+            params.append(f'%{vendor}%')
+        if date_from:
+            where.append('i.invoice_day >= ?')
+            params.append(_filter_date(date_from, 'date_from'))
+        if date_to:
+            where.append('i.invoice_day <= ?')
+            params.append(_filter_date(date_to, 'date_to'))
+        if amount_min is not None:
+            where.append('i.total_amount >= ?')
+            params.append(amount_min)
+        if amount_max is not None:
+            where.append('i.total_amount <= ?')
+            params.append(amount_max)
+
+        select = (
+            f'SELECT i.id, i.filename, i.invoice_number, i.invoice_date, i.invoice_day, i.gstin, i.vendor_name, '
+            f'i.total_amount, i.predicted_total, {select_snippet} '
+            f'FROM invoices i {" ".join(joins)} '
+        )
+
+        # Each phase is (name, filter, keyset condition after a cursor, order)
+        if match:
+            phases = [('rank', None, '(f.rank > ? OR (f.rank = ? AND i.id > ?))', 'f.rank, i.id')]
+        else:
+            # Newest first by ISO date; rows without a parseable date follow, newest id first
+            phases = [('day', 'i.invoice_day IS NOT NULL', '(i.invoice_day, i.id) < (?, ?)',
+                       'i.invoice_day DESC, i.id DESC')]
+            if not (date_from or date_to):
+                phases.append(('undated', 'i.invoice_day IS NULL', 'i.id < ?', 'i.id DESC'))
+
+        names = [phase[0] for phase in phases]
+        if after is not None:
+            if after[0] not in names:
+                raise ValueError('Invalid cursor')
+            # Phases before the cursor's one are already exhausted
+            phases = phases[names.index(after[0]):]
+
+        started = time.perf_counter()
+        rows = []
+        with self._lock:
+            for name, phase_filter, keyset, order_by in phases:
+                phase_where, phase_params = list(where), list(params)
+                if phase_filter:
+                    phase_where.append(phase_filter)
+                if after is not None and after[0] == name:
+                    phase_where.append(keyset)
+                    phase_params += _cursor_params(after)
+
+                # Fetch one extra row to know whether another page exists without counting every match
+                sql = (
+                    f'{select}{"WHERE " + " AND ".join(phase_where) if phase_where else ""} '
+                    f'ORDER BY {order_by} LIMIT ?'
+                )
+                fetched = self._conn.execute(sql, join_params + phase_params + [per_page + 1 - len(rows)]).fetchall()
+                rows += [(name, dict(row)) for row in fetched]
+                if len(rows) > per_page:
+                    break
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        results = [row for _, row in rows]
+        next_cursor = _encode_cursor(*rows[-1]) if has_more else None
+        for row in results:
+            row.pop('rank', None)
+
+        return {
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'results': results,
+            'query_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM invoices').fetchone()[0]
+
+def _iso_date(value) -> Optional[str]:
+    """YYYY-MM-DD for a parseable invoice date, None otherwise"""
+    normalized = normalize_date(str(value or '').strip())
+    try:
+        return datetime.strptime(normalized, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _filter_date(value: str, name: str) -> str:
+    iso = _iso_date(value)
+    if iso is None:
+        raise ValueError(f"Invalid {name}: {value}")
+    return iso
+
+def _encode_cursor(phase: str, row: Dict[str, Any]) -> str:
+    """Opaque cursor holding the sort key of the last row returned"""
+    if phase == 'rank':
+        key = [phase, row['rank'], row['id']]
+    elif phase == 'day':
+        key = [phase, row['invoice_day'], row['id']]
+    else:
+        key = [phase, row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    sizes = {'rank': 3, 'day': 3, 'undated': 2}
+    if not isinstance(key, list) or not key or not isinstance(key[0], str) or len(key) != sizes.get(key[0]):
+        raise ValueError('Invalid cursor')
+    return key
+
+def _cursor_params(key: List[Any]) -> List[Any]:
+    """Bind parameters for the keyset condition of the cursor's phase"""
+    if key[0] == 'rank':
+        return [key[1], key[1], key[2]]
+    return key[1:]
+
+def _fts_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix"""
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    return ' AND '.join(terms)
+
+# Shared search index (database path is set from app config in create_app)
+search_index = SearchIndex()
@@ -0,0 +1,236 @@
+"""
+Content-addressed storage utilities
+Deduplicates uploads by SHA-256 in a sharded layout, tracks references in SQLite and sweeps expired files
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from app.utils.export_utils import cleanup_old_exports
+
+CHUNK_SIZE = 1024 * 1024
+
+class ContentStore:
+    """Stores each distinct file once under objects/ab/cd/<sha256>, with named references counting uses"""
+
+    def __init__(self, root: Optional[str] = None, compress: bool = False):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.root = root
+        self.compress = compress
+        if root:
+            self.configure(root, compress)
+
+    def configure(self, root: str, compress: bool = False):
+        """Point the store at a root directory, creating the index if needed"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self.root = root
+            self.compress = compress
+            os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    compressed INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS refs (
+                    name TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL REFERENCES objects(digest),
+                    kind TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS refs_kind_created ON refs(kind, created_at);
+                CREATE INDEX IF NOT EXISTS objects_orphans ON objects(refcount);
+            ''')
+            self._conn.commit()
+
+    def _object_path(self, digest: str, ext: str, compressed: bool) -> str:
+        suffix = f'{ext}.gz' if compressed else ext
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:4], f'{digest}{suffix}')
+
+    def put(self, stream, name: str, kind: str = 'upload') -> str:
+        """Store a file-like object under a reference name, returning its content digest"""
+        ext = os.path.splitext(name)[1].lower()
+        hasher = hashlib.sha256()
+        size = 0
+
+        # Hash while spooling to a temp file in the store so the final move is a rename
+        tmp_dir = os.path.join(self.root, 'objects')
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+
+        try:
+            with self._lock:
+                row = self._conn.execute('SELECT refcount FROM objects WHERE digest = ?', (digest,)).fetchone()
+                if row is None:
+                    path = self._object_path(digest, ext, self.compress)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.compress:
+                        with open(tmp.name, 'rb') as src, gzip.open(path, 'wb', compresslevel=6) as dst:
+                            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                    else:
+                        os.replace(tmp.name, path)
+                    self._conn.execute(
+                        'INSERT INTO objects VALUES (?, ?, ?, ?, ?, 0, ?)',
+                        (digest, ext, size, os.path.getsize(path), int(self.compress), time.time())
+                    )
+
+                previous = self._conn.execute('SELECT digest FROM refs WHERE name = ?', (name,)).fetchone()
+                replaced = previous is not None and previous[0] != digest
+                if previous is not None:
+                    self._conn.execute('UPDATE objects SET refcount = refcount - 1 WHERE digest = ?', previous)
+                self._conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)', (name, digest, kind, time.time()))
+                self._conn.execute('UPDATE objects SET refcount = refcount + 1 WHERE digest = ?', (digest,))
+                self._conn.commit()
+        finally:
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+
+        # Reusing a name for new content may leave the old object unreferenced
+        if replaced:
+            self._delete_orphans()
+        return digest
+
+    def _lookup(self, name: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT o.digest, o.ext, o.compressed FROM refs r JOIN objects o ON o.digest = r.digest WHERE r.name = ?',
+                (name,)
+            ).fetchone()
+
+    def exists(self, name: str) -> bool:
+        return self._lookup(name) is not None
+
+    def digest_for(self, name: str) -> Optional[str]:
+        row = self._lookup(name)
+        return row[0] if row else None
+
+    @contextmanager
+    def materialize(self, name: str):
+        """Yield a local path holding the file's bytes (a temp copy when the object is compressed)"""
+        row = self._lookup(name)
+        if row is None:
+            raise FileNotFoundError(f"File not found: {name}")
+        digest, ext, compressed = row
+        path = self._object_path(digest, ext, bool(compressed))
+
+        if not compressed:
+            yield path
+            return
+
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+            with gzip.open(path, 'rb') as src:
+                shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+        try:
+            yield tmp.name
+        finally:
+            os.remove(tmp.name)
+
+    def release(self, name: str) -> bool:
+        """Drop a reference; the object is deleted once nothing refers to it"""
+        with self._lock:
+            row = self._conn.execute('SELECT digest FROM refs WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute('DELETE FROM refs WHERE name = ?', (name,))
+            self._conn.execute('UPDATE objects SET refcount = refcount - 1 WHERE digest = ?', row)
+            self._conn.commit()
+        self._delete_orphans()
+        return True
+
+    def _delete_orphans(self) -> int:
+        with self._lock:
+            orphans = self._conn.execute(
+                'SELECT digest, ext, compressed FROM objects WHERE refcount <= 0').fetchall()
+            for digest, ext, compressed in orphans:
+                path = self._object_path(digest, ext, bool(compressed))
+                if os.path.exists(path):
+                    os.remove(path)
+            self._conn.executemany('DELETE FROM objects WHERE digest = ?', [(row[0],) for row in orphans])
+            self._conn.commit()
+        return len(orphans)
+
+    def sweep(self, retention_days: Dict[str, float]) -> Dict[str, int]:
+        """Expire references older than each kind's retention and delete unreferenced objects"""
+        expired = 0
+        now = time.time()
+        with self._lock:
+            for kind, days in retention_days.items():
+                if not days:
+                    continue
+                cutoff = now - days * 24 * 60 * 60
+                rows = self._conn.execute(
+                    'SELECT name, digest FROM refs WHERE kind = ? AND created_at < ?', (kind, cutoff)).fetchall()
+                for name, digest in rows:
+                    self._conn.execute('DELETE FROM refs WHERE name = ?', (name,))
+                    self._conn.execute('UPDATE objects SET refcount = refcount - 1 WHERE digest = ?', (digest,))
+                expired += len(rows)
+            self._conn.commit()
+        return {'expired_refs': expired, 'deleted_objects': self._delete_orphans()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Reference and object counts with logical vs stored bytes"""
+        with self._lock:
+            refs = self._conn.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+            objects, logical, stored = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects').fetchone()
+            referenced = self._conn.execute(
+                'SELECT COALESCE(SUM(o.size), 0) FROM refs r JOIN objects o ON o.digest = r.digest').fetchone()[0]
+        return {
+            'references': refs,
+            'objects': objects,
+            'referenced_bytes': referenced,
+            'unique_bytes': logical,
+            'stored_bytes': stored
+        }
+
+    def start_sweeper(self, retention_days: Dict[str, float], interval: float = 3600,
+                      export_retention_days: Optional[int] = 7):
+        """Run sweep (and export cleanup) periodically in a daemon thread"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    result = self.sweep(retention_days)
+                    if export_retention_days:
+                        cleanup_old_exports(export_retention_days)
+                    if result['expired_refs'] or result['deleted_objects']:
+                        print(f"Storage sweep: {result}")
+                except Exception as e:
+                    print(f"Error in storage sweep: {str(e)}")
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=run, name='storage-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+# Shared upload store (root, compression and retention are set from app config in create_app)
+upload_store = ContentStore()
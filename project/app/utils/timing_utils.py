@@ -0,0 +1,38 @@
+"""
+Request timing utilities
+Collects per-stage durations for the current request and reports them in a Server-Timing header
+"""
+
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+def start_request_timer():
+    """before_request hook: note when the app started handling the request"""
+    g.request_started = time.perf_counter()
+
+def record_stage(name: str, seconds: float):
+    """Add a stage duration to the current request (ignored outside a request)"""
+    if has_request_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+@contextmanager
+def timed_stage(name: str):
+    """Time a block of work as a named stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def add_server_timing(response):
+    """after_request hook: expose stage timings (milliseconds) as a Server-Timing header"""
+    timings = dict(g.get('stage_timings', {}))
+    if 'request_started' in g:
+        timings['app'] = time.perf_counter() - g.request_started
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+    return response
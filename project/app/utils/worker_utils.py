@@ -0,0 +1,244 @@
+"""
+OCR worker process utilities
+Runs OCR in supervised worker processes with an RSS budget, job-count recycling and per-job peak memory
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Number of recent per-job memory samples kept for reporting
+JOB_SAMPLE_SIZE = 200
+
+# A job is killed outright once its worker grows past this multiple of the RSS budget
+HARD_LIMIT_FACTOR = 1.5
+
+class WorkerError(Exception):
+    """Raised when an OCR worker crashes, times out or is killed for exceeding its memory limit"""
+
+def _page_size() -> int:
+    try:
+        return os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+def process_rss(pid: int) -> int:
+    """Current resident set size of a process in bytes (0 where /proc is unavailable)"""
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * _page_size()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss() -> int:
+    """Peak resident set size of this process in bytes since the last reset"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+def _worker_main(conn, max_pixels, engine, stub_latency):
+    """Worker loop: receive (file_path, second_pass) jobs and reply with OCR output and memory figures"""
+    from app.utils.ocr_utils import extract_ocr_from_file, set_decode_limit
+
+    set_decode_limit(max_pixels)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        file_path, second_pass = job
+        _reset_peak_rss()
+        started = time.perf_counter()
+        try:
+            ocr = extract_ocr_from_file(file_path, second_pass=second_pass, max_pixels=max_pixels,
+                                        engine=engine, stub_latency=stub_latency)
+            error = None
+        except Exception as e:
+            ocr, error = None, f'{type(e).__name__}: {str(e)}'
+
+        conn.send({
+            'ocr': ocr,
+            'error': error,
+            'seconds': time.perf_counter() - started,
+            'peak_rss': _peak_rss(),
+            'rss': process_rss(os.getpid())
+        })
+
+class _Worker:
+    def __init__(self, context, max_pixels, engine, stub_latency):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, max_pixels, engine, stub_latency),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+        self.peak_rss = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+class OCRWorkerPool:
+    """Fixed number of OCR worker processes, recycled after max_jobs or when over the RSS budget"""
+
+    def __init__(self, processes: int = 2, rss_budget_mb: int = 1500, max_jobs: int = 200,
+                 job_timeout: float = 300, max_pixels: Optional[int] = None, engine: str = 'easyocr',
+                 stub_latency: float = 0.5):
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._slots = None
+        self._context = multiprocessing.get_context('spawn')
+        self._jobs = deque(maxlen=JOB_SAMPLE_SIZE)
+        self._recycled = {'max_jobs': 0, 'rss_budget': 0, 'killed': 0, 'crashed': 0}
+        self.configure(processes, rss_budget_mb, max_jobs, job_timeout, max_pixels, engine, stub_latency)
+
+    def configure(self, processes: int = 2, rss_budget_mb: int = 1500, max_jobs: int = 200,
+                  job_timeout: float = 300, max_pixels: Optional[int] = None, engine: str = 'easyocr',
+                  stub_latency: float = 0.5):
+        """Set pool limits (call before the pool is in use, idle workers are stopped)"""
+        self.shutdown()
+        with self._lock:
+            self.processes = max(1, processes)
+            self.rss_budget = rss_budget_mb * 1024 * 1024
+            self.max_jobs = max_jobs
+            self.job_timeout = job_timeout
+            self.max_pixels = max_pixels
+            self.engine = engine
+            self.stub_latency = stub_latency
+            self._slots = threading.BoundedSemaphore(self.processes)
+
+    def _checkout(self) -> _Worker:
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return _Worker(self._context, self.max_pixels, self.engine, self.stub_latency)
+            except Exception:
+                self._slots.release()
+                raise
+
+    def _checkin(self, worker: _Worker, reason: Optional[str] = None):
+        """Return a worker to the idle pool, or stop it if it has to be recycled"""
+        if reason is None and worker.jobs >= self.max_jobs:
+            reason = 'max_jobs'
+        elif reason is None and self.rss_budget and worker.rss > self.rss_budget:
+            reason = 'rss_budget'
+
+        if reason:
+            with self._lock:
+                self._recycled[reason] += 1
+            worker.stop(kill=reason in ('killed', 'crashed'))
+        else:
+            self._idle.put(worker)
+        self._slots.release()
+
+    def run(self, file_path: str, second_pass: bool = False) -> Dict[str, Any]:
+        """Extract text and token boxes from a file in a worker process (see extract_ocr_from_file)"""
+        worker = self._checkout()
+        deadline = time.monotonic() + self.job_timeout
+        hard_limit = self.rss_budget * HARD_LIMIT_FACTOR
+
+        try:
+            worker.conn.send((file_path, second_pass))
+
+            # Supervise the job: memory, liveness and timeout
+            while not worker.conn.poll(0.25):
+                if not worker.process.is_alive():
+                    self._checkin(worker, 'crashed')
+                    raise WorkerError('OCR worker exited unexpectedly')
+                if hard_limit and process_rss(worker.process.pid) > hard_limit:
+                    self._checkin(worker, 'killed')
+                    raise WorkerError('OCR worker exceeded its memory limit')
+                if time.monotonic() > deadline:
+                    self._checkin(worker, 'killed')
+                    raise WorkerError('OCR worker timed out')
+
+            reply = worker.conn.recv()
+
+        except (EOFError, OSError, BrokenPipeError):
+            self._checkin(worker, 'crashed')
+            raise WorkerError('Lost connection to OCR worker')
+
+        worker.jobs += 1
+        worker.rss = reply['rss']
+        worker.peak_rss = max(worker.peak_rss, reply['peak_rss'])
+        with self._lock:
+            self._jobs.append({
+                'file': os.path.basename(file_path),
+                'seconds': round(reply['seconds'], 3),
+                'peak_rss_mb': round(reply['peak_rss'] / (1024 * 1024), 1),
+                'worker_pid': worker.process.pid
+            })
+        self._checkin(worker)
+
+        if reply['error']:
+            raise WorkerError(reply['error'])
+        return reply['ocr']
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-job peak memory and recycling counters"""
+        with self._lock:
+            jobs = list(self._jobs)
+            peaks = sorted(job['peak_rss_mb'] for job in jobs)
+            return {
+                'processes': self.processes,
+                'engine': self.engine,
+                'rss_budget_mb': round(self.rss_budget / (1024 * 1024)),
+                'max_jobs': self.max_jobs,
+                'idle_workers': self._idle.qsize(),
+                'recycled': dict(self._recycled),
+                'job_peak_rss_mb': {
+                    'max': peaks[-1] if peaks else 0.0,
+                    'p95': peaks[min(len(peaks) - 1, int(len(peaks) * 0.95))] if peaks else 0.0,
+                    'samples': len(peaks)
+                },
+                'recent_jobs': jobs[-20:]
+            }
+
+    def shutdown(self):
+        """Stop all idle workers"""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+# Shared pool used by the OCR routes (limits are set from app config in create_app)
+ocr_worker_pool = OCRWorkerPool()
@@ -0,0 +1,415 @@
+"""
+Invoice Digitization & Tax Prediction Tool
+HTTP load generator: replays a corpus of invoice files against a running server and reports throughput,
+latency percentiles, error rates and the server-side stage timings sent in Server-Timing headers
+
+Start the server with the stub OCR engine to load the web tier without the model:
+    OCR_ENGINE=stub OCR_STUB_LATENCY=0.5 python main.py
+    python loadtest.py --corpus samples/ --concurrency 16 --rate 10 --duration 60
+    python loadtest.py --corpus samples/ --mix upload=1 --follow-upload
+"""
+
+import argparse
+import itertools
+import json
+import mimetypes
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+
+ENDPOINTS = {
+    'analyze': '/api/analyze',
+    'upload': '/upload',
+    'export': '/api/export'
+}
+
+CORPUS_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.pdf'}
+
+# Used by export requests until an analyze response provides a real result
+SAMPLE_EXPORT_DATA = {
+    'filename': 'sample.png',
+    'invoice_data': {
+        'invoice_number': 'INV-001',
+        'invoice_date': '2024-01-15',
+        'gstin': '29ABCDE1234F1Z5',
+        'vendor_name': 'Sample Traders',
+        'total_amount': 1770.0,
+        'line_items': [{'description': 'Consulting service', 'amount': 1500.0}]
+    },
+    'tax_data': {
+        'line_items_with_tax': [{'description': 'Consulting service', 'amount': 1500.0, 'category': 'services',
+                                 'tax_rate': 18.0, 'tax_amount': 270.0, 'total_with_tax': 1770.0}],
+        'tax_summary': {'total_taxable_amount': 1500.0, 'total_tax_amount': 270.0,
+                        'tax_breakdown': {'cgst': 135.0, 'sgst': 135.0, 'igst': 0.0}},
+        'predicted_total': 1770.0
+    }
+}
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, so /upload (which only stores the file) is timed apart from the
+    OCR run on /process/<name> it redirects to; LoadTest follows that redirect itself when asked
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def load_corpus(paths):
+    """Read every supported invoice file under the given files and directories into memory"""
+    files = []
+    for path in paths:
+        candidates = [path]
+        if os.path.isdir(path):
+            candidates = sorted(
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for candidate in candidates:
+            if os.path.splitext(candidate)[1].lower() in CORPUS_EXTENSIONS:
+                with open(candidate, 'rb') as f:
+                    files.append((os.path.basename(candidate), f.read()))
+    if not files:
+        raise SystemExit('No invoice files (.png, .jpg, .jpeg, .pdf) found in the corpus')
+    return files
+
+def encode_multipart(filename, content):
+    """Build a multipart/form-data body with a single 'file' field"""
+    boundary = uuid.uuid4().hex
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+        f'Content-Type: {content_type}\r\n\r\n'.encode(),
+        content,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def parse_server_timing(header):
+    """Parse 'name;dur=12.3, other;dur=4' into {name: milliseconds}"""
+    timings = {}
+    for entry in (header or '').split(','):
+        parts = [part.strip() for part in entry.split(';')]
+        if not parts[0]:
+            continue
+        for param in parts[1:]:
+            if param.startswith('dur='):
+                try:
+                    timings[parts[0]] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoadTest:
+    """Sends a weighted mix of requests, closed-loop (back to back) or open-loop at a target arrival rate"""
+
+    def __init__(self, base_url, corpus, mix, concurrency=4, rate=None, arrival='poisson',
+                 duration=60.0, max_requests=None, timeout=300.0, api_key=None, priority=None,
+                 follow_upload=False, seed=1):
+        self.base_url = base_url.rstrip('/')
+        self.corpus = corpus
+        self.mix = mix
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.arrival = arrival
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.api_key = api_key
+        self.priority = priority
+        self.follow_upload = follow_upload
+        self.random = random.Random(seed)
+        self._opener = urllib.request.build_opener(_NoRedirect)
+        self._lock = threading.Lock()
+        self._corpus_cycle = itertools.cycle(corpus)
+        self._export_data = SAMPLE_EXPORT_DATA
+        self._samples = []
+        self._sent = 0
+
+    def _next_request(self):
+        """Pick the next endpoint from the weighted mix and the next corpus file, or None when done"""
+        with self._lock:
+            if self.max_requests is not None and self._sent >= self.max_requests:
+                return None
+            self._sent += 1
+            endpoint = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+            return endpoint, next(self._corpus_cycle)
+
+    def _headers(self):
+        headers = {}
+        if self.api_key:
+            headers['X-API-Key'] = self.api_key
+        if self.priority:
+            headers['X-Priority'] = self.priority
+        return headers
+
+    def _build(self, endpoint, corpus_file):
+        url = self.base_url + ENDPOINTS[endpoint]
+        headers = self._headers()
+
+        if endpoint == 'export':
+            with self._lock:
+                data = self._export_data
+            body = json.dumps({'format': 'json', 'data': data}).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        else:
+            body, headers['Content-Type'] = encode_multipart(*corpus_file)
+        return urllib.request.Request(url, data=body, headers=headers, method='POST')
+
+    def _open(self, request):
+        """Send a request without following redirects: (status, error, Server-Timing, body, Location)"""
+        status, error, header, payload, location = 0, None, '', b'', None
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                status = response.status
+                header = response.headers.get('Server-Timing', '')
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            if e.headers:
+                header = e.headers.get('Server-Timing', '')
+                location = e.headers.get('Location')
+            if status >= 400:
+                error = f'HTTP {status}'
+        except Exception as e:
+            error = type(e).__name__
+        return status, error, header, payload, location
+
+    def _record(self, endpoint, status, error, header, started_at, sent_at, finished_at):
+        with self._lock:
+            self._samples.append({
+                'endpoint': endpoint,
+                'status': status,
+                'error': error,
+                'latency': finished_at - started_at,
+                'service': finished_at - sent_at,
+                'finished_at': finished_at,
+                'server_timing': parse_server_timing(header)
+            })
+
+    def _send(self, endpoint, corpus_file, scheduled_at):
+        """Send one request and record its outcome; open-loop latency counts from the scheduled time"""
+        request = self._build(endpoint, corpus_file)
+        sent_at = time.perf_counter()
+        status, error, header, payload, location = self._open(request)
+        finished_at = time.perf_counter()
+
+        # Reuse real analyze results as export payloads so exports carry realistic line items
+        if endpoint == 'analyze' and status == 200:
+            try:
+                result = json.loads(payload)
+                result.pop('raw_text', None)
+                with self._lock:
+                    self._export_data = result
+            except ValueError:
+                pass
+
+        self._record(endpoint, status, error, header,
+                     scheduled_at if scheduled_at is not None else sent_at, sent_at, finished_at)
+
+        # A stored upload redirects to /process/<name>, where the OCR actually runs
+        if endpoint == 'upload' and self.follow_upload and location and '/process/' in location:
+            self._follow_process(urllib.parse.urljoin(request.full_url, location))
+
+    def _follow_process(self, url):
+        """GET the /process page an upload redirected to and record it as the 'process' endpoint"""
+        request = urllib.request.Request(url, headers=self._headers(), method='GET')
+        sent_at = time.perf_counter()
+        status, error, header, _, _ = self._open(request)
+        finished_at = time.perf_counter()
+        # /process reports failures (busy, unreadable file) by redirecting back to the upload page
+        if error is None and status != 200:
+            error = f'HTTP {status}'
+        self._record('process', status, error, header, sent_at, sent_at, finished_at)
+
+    def _closed_loop_worker(self, deadline):
+        while time.perf_counter() < deadline:
+            job = self._next_request()
+            if job is None:
+                return
+            self._send(*job, scheduled_at=None)
+
+    def _open_loop_worker(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            self._send(*job)
+
+    def run(self):
+        """Run the test and return the report"""
+        started = time.perf_counter()
+        deadline = started + self.duration
+        workers = []
+
+        if self.rate:
+            jobs = queue.Queue()
+            for _ in range(self.concurrency):
+                worker = threading.Thread(target=self._open_loop_worker, args=(jobs,), daemon=True)
+                worker.start()
+                workers.append(worker)
+
+            # Arrivals follow the schedule regardless of how fast the server answers
+            scheduled_at = started
+            while scheduled_at < deadline:
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                job = self._next_request()
+                if job is None:
+                    break
+                jobs.put((*job, scheduled_at))
+                scheduled_at += self.random.expovariate(self.rate) if self.arrival == 'poisson' else 1.0 / self.rate
+            for _ in workers:
+                jobs.put(None)
+        else:
+            for _ in range(self.concurrency):
+                worker = threading.Thread(target=self._closed_loop_worker, args=(deadline,), daemon=True)
+                worker.start()
+                workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+        return self.report(time.perf_counter() - started)
+
+    def server_metrics(self):
+        """Fetch scheduler and worker metrics from the server (best effort)"""
+        metrics = {}
+        for name, path in (('scheduler', '/api/scheduler/metrics'), ('workers', '/api/workers/metrics')):
+            try:
+                with self._opener.open(self.base_url + path, timeout=10) as response:
+                    metrics[name] = json.loads(response.read())
+            except Exception as e:
+                metrics[name] = {'error': str(e)}
+        return metrics
+
+    def report(self, elapsed):
+        """Throughput, latency percentiles, error rates and stage timings per endpoint and overall"""
+        with self._lock:
+            samples = list(self._samples)
+
+        groups = defaultdict(list)
+        for sample in samples:
+            groups[sample['endpoint']].append(sample)
+        groups['all'] = samples
+
+        report = {
+            'elapsed_seconds': round(elapsed, 3),
+            'concurrency': self.concurrency,
+            'target_rate': self.rate,
+            'arrival': self.arrival if self.rate else 'closed-loop',
+            'endpoints': {}
+        }
+        for endpoint, group in groups.items():
+            latencies = sorted(sample['latency'] * 1000 for sample in group)
+            errors = [sample for sample in group if sample['error']]
+            statuses = defaultdict(int)
+            stages = defaultdict(list)
+            for sample in group:
+                statuses[str(sample['status'] or sample['error'])] += 1
+                for stage, milliseconds in sample['server_timing'].items():
+                    stages[stage].append(milliseconds)
+
+            report['endpoints'][endpoint] = {
+                'requests': len(group),
+                'throughput_rps': round((len(group) - len(errors)) / elapsed, 2) if elapsed else 0.0,
+                'error_rate': round(len(errors) / len(group), 4) if group else 0.0,
+                'statuses': dict(statuses),
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 1),
+                    'p95': round(percentile(latencies, 95), 1),
+                    'p99': round(percentile(latencies, 99), 1),
+                    'max': round(latencies[-1], 1) if latencies else 0.0,
+                    'mean': round(sum(latencies) / len(latencies), 1) if latencies else 0.0
+                },
+                'server_stages_ms': {
+                    stage: {
+                        'mean': round(sum(values) / len(values), 1),
+                        'p95': round(percentile(sorted(values), 95), 1),
+                        'samples': len(values)
+                    }
+                    for stage, values in sorted(stages.items())
+                }
+            }
+        return report
+
+def parse_mix(value):
+    """Parse 'analyze=6,upload=3,export=1' into endpoint weights"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+def print_report(report):
+    print(f"\nElapsed {report['elapsed_seconds']}s, concurrency {report['concurrency']}, "
+          f"arrival {report['arrival']}" + (f" at {report['target_rate']} req/s" if report['target_rate'] else ''))
+    print(f"{'endpoint':<10} {'requests':>8} {'ok req/s':>9} {'errors':>7} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for endpoint, stats in report['endpoints'].items():
+        latency = stats['latency_ms']
+        print(f"{endpoint:<10} {stats['requests']:>8} {stats['throughput_rps']:>9} "
+              f"{stats['error_rate'] * 100:>6.1f}% {latency['p50']:>9} {latency['p95']:>9} "
+              f"{latency['p99']:>9} {latency['max']:>9}")
+
+    for endpoint, stats in report['endpoints'].items():
+        if endpoint == 'all' or not stats['server_stages_ms']:
+            continue
+        stages = ', '.join(f"{stage} {values['mean']}/{values['p95']}"
+                           for stage, values in stats['server_stages_ms'].items())
+        print(f"  {endpoint} server stages (mean/p95 ms): {stages}")
+        print(f"  {endpoint} statuses: {stats['statuses']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay invoice files against a running server')
+    parser.add_argument('--url', default='http://localhost:5000', help='Server base URL')
+    parser.add_argument('--corpus', nargs='+', required=True, help='Invoice files or directories to replay')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('analyze=1'),
+                        help='Weighted endpoint mix, e.g. analyze=6,upload=3,export=1')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client connections')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Target arrivals per second (open loop); omit to send back to back')
+    parser.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson',
+                        help='Inter-arrival distribution at the target rate')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to generate load for')
+    parser.add_argument('--requests', type=int, default=None, help='Stop after this many requests')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Per-request timeout in seconds')
+    parser.add_argument('--api-key', default=None, help='X-API-Key header to send (selects a configured tenant)')
+    parser.add_argument('--priority', choices=['interactive', 'bulk'], default=None, help='X-Priority header to send')
+    parser.add_argument('--follow-upload', action='store_true',
+                        help="Follow each upload's redirect to /process/<name> and time it as 'process'")
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the endpoint mix and arrivals')
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write the report to this file')
+    args = parser.parse_args()
+
+    test = LoadTest(
+        args.url, load_corpus(args.corpus), args.mix,
+        concurrency=args.concurrency, rate=args.rate, arrival=args.arrival, duration=args.duration,
+        max_requests=args.requests, timeout=args.timeout, api_key=args.api_key, priority=args.priority,
+        follow_upload=args.follow_upload, seed=args.seed
+    )
+    report = test.run()
+    report['server_metrics'] = test.server_metrics()
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+
+if __name__ == '__main__':
+    main()
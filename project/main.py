@@ -8,6 +8,18 @@ import os
 from app.routes.upload import upload_bp
 from app.routes.ocr import ocr_bp
 from app.routes.extract import extract_bp
+from app.routes.reconcile import reconcile_bp
+from app.routes.dashboard import dashboard_bp
+from app.routes.search import search_bp
+from app.routes.archive import archive_bp
+from app.utils.scheduler_utils import ocr_scheduler, ANONYMOUS_TENANT
+from app.utils.analytics_utils import analytics_store
+from app.utils.worker_utils import ocr_worker_pool
+from app.utils.storage_utils import upload_store
+from app.utils.search_utils import search_index
+from app.utils.archive_utils import ocr_archive
+from app.utils.ocr_utils import set_decode_limit
+from app.utils.timing_utils import start_request_timer, add_server_timing
 from flask_cors import CORS
 
 def create_app():
@@ -18,19 +30,91 @@ def create_app():
     app.config['SECRET_KEY'] = 'your-secret-key-here'
     app.config['UPLOAD_FOLDER'] = 'uploads'
     app.config['EXPORT_FOLDER'] = 'exports'
+    app.config['DATA_FOLDER'] = 'data'
+    app.config['ANALYTICS_PATH'] = os.path.join('data', 'analytics.json')
+    app.config['SEARCH_INDEX_PATH'] = os.path.join('data', 'search.sqlite3')
+    app.config['ARCHIVE_PATH'] = os.path.join('data', 'archive.sqlite3')  # OCR output and versioned results
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     
+    # Upload storage (content-addressed, deduplicated)
+    app.config['STORAGE_COMPRESS'] = False  # gzip stored objects
+    app.config['STORAGE_RETENTION_DAYS'] = {'upload': 90}  # Per-kind retention, None keeps forever
+    app.config['EXPORT_RETENTION_DAYS'] = 7
+    app.config['STORAGE_SWEEP_INTERVAL'] = 3600  # Seconds between background sweeps
+    
+    # Text extraction
+    app.config['PDF_MAX_PAGES'] = 50  # Stop reading PDF text layers after this many pages
+    app.config['OCR_SECOND_PASS'] = False  # Re-read up to 6 weak regions per image (missing critical fields first)
+    app.config['OCR_ENGINE'] = os.environ.get('OCR_ENGINE', 'easyocr')  # 'stub' for load testing without the model
+    app.config['OCR_STUB_LATENCY'] = float(os.environ.get('OCR_STUB_LATENCY', 0.5))  # Seconds per file in stub mode
+    
+    # OCR scheduling (fair queuing across tenants)
+    app.config['OCR_MAX_WORKERS'] = 2  # Concurrent OCR jobs per process
+    app.config['OCR_INTERACTIVE_RESERVED'] = 1  # Workers bulk jobs can never occupy
+    app.config['OCR_API_KEYS'] = {}  # X-API-Key value -> tenant name; other clients share one anonymous tenant
+    app.config['OCR_TENANT_CONCURRENCY'] = 1  # Concurrent OCR jobs per tenant
+    app.config['OCR_TENANT_CONCURRENCY_OVERRIDES'] = {ANONYMOUS_TENANT: 2}  # e.g. {'acme': 2}
+    app.config['OCR_TENANT_RATE'] = None  # Jobs per second per tenant (None = unlimited)
+    app.config['OCR_TENANT_BURST'] = 5
+    app.config['OCR_TENANT_WEIGHTS'] = {}  # Tenant name -> weight, e.g. {'acme': 2.0}
+    app.config['OCR_QUEUE_TIMEOUT'] = 120  # Seconds a job may wait before a 429
+    
+    # OCR worker processes (memory governor)
+    app.config['OCR_USE_WORKER_PROCESSES'] = True  # Run OCR outside the web process
+    app.config['OCR_WORKER_RSS_BUDGET_MB'] = 1500  # Recycle a worker once it grows past this
+    app.config['OCR_WORKER_MAX_JOBS'] = 200  # Recycle a worker after this many jobs
+    app.config['OCR_WORKER_JOB_TIMEOUT'] = 300  # Seconds before a stuck OCR job is killed
+    app.config['OCR_MAX_PIXELS'] = 12_000_000  # Larger images are downscaled before decode, above 4x refused
+    
     # Create directories if they don't exist
     os.makedirs('uploads', exist_ok=True)
     os.makedirs('exports', exist_ok=True)
+    os.makedirs('data', exist_ok=True)
     os.makedirs('app/static', exist_ok=True)
     
+    set_decode_limit(app.config['OCR_MAX_PIXELS'])
+    analytics_store.configure(app.config['ANALYTICS_PATH'])
+    search_index.configure(app.config['SEARCH_INDEX_PATH'])
+    ocr_archive.configure(app.config['ARCHIVE_PATH'])
+    upload_store.configure(app.config['UPLOAD_FOLDER'], compress=app.config['STORAGE_COMPRESS'])
+    upload_store.start_sweeper(
+        app.config['STORAGE_RETENTION_DAYS'],
+        interval=app.config['STORAGE_SWEEP_INTERVAL'],
+        export_retention_days=app.config['EXPORT_RETENTION_DAYS']
+    )
+    ocr_worker_pool.configure(
+        processes=app.config['OCR_MAX_WORKERS'],
+        rss_budget_mb=app.config['OCR_WORKER_RSS_BUDGET_MB'],
+        max_jobs=app.config['OCR_WORKER_MAX_JOBS'],
+        job_timeout=app.config['OCR_WORKER_JOB_TIMEOUT'],
+        max_pixels=app.config['OCR_MAX_PIXELS'],
+        engine=app.config['OCR_ENGINE'],
+        stub_latency=app.config['OCR_STUB_LATENCY']
+    )
+    ocr_scheduler.configure(
+        max_workers=app.config['OCR_MAX_WORKERS'],
+        interactive_reserved=app.config['OCR_INTERACTIVE_RESERVED'],
+        tenant_concurrency=app.config['OCR_TENANT_CONCURRENCY'],
+        tenant_rate=app.config['OCR_TENANT_RATE'],
+        tenant_burst=app.config['OCR_TENANT_BURST'],
+        tenant_weights=app.config['OCR_TENANT_WEIGHTS'],
+        tenant_concurrency_overrides=app.config['OCR_TENANT_CONCURRENCY_OVERRIDES']
+    )
+    
     # Register blueprints
     app.register_blueprint(upload_bp)
     app.register_blueprint(ocr_bp)
     app.register_blueprint(extract_bp)
+    app.register_blueprint(reconcile_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(archive_bp)
     CORS(app)  # Enable CORS for all routes
     
+    # Per-stage durations are reported to clients (and load tests) in a Server-Timing header
+    app.before_request(start_request_timer)
+    app.after_request(add_server_timing)
+    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the app package importable when pytest runs from the project directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
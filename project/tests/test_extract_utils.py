@@ -0,0 +1,53 @@
+from app.utils.extract_utils import extract_invoice_fields, extract_invoice_fields_from_pages
+
+HEADER_PAGE = (
+    'Acme Traders Pvt Ltd\n'
+    'Invoice No: INV-2024-001\n'
+    'Date: 05/03/2024\n'
+    'GSTIN: 29ABCDE1234F1Z5\n'
+    'Consulting service 1500.00\n'
+)
+
+def counting_pages(texts):
+    """Page generator that records how many pages were pulled from it"""
+    state = {'yielded': 0}
+
+    def generate():
+        for number, text in enumerate(texts, start=1):
+            state['yielded'] += 1
+            yield number, text, 0.01
+
+    return generate(), state
+
+def test_stops_reading_once_fields_and_labelled_total_found():
+    texts = [HEADER_PAGE + 'Grand Total: Rs. 1770.00\n'] + ['Terms and conditions 12.00\n'] * 199
+    pages, state = counting_pages(texts)
+
+    invoice_data = extract_invoice_fields_from_pages(pages)
+
+    assert state['yielded'] == 1
+    assert invoice_data['pages_scanned'] == 1
+    assert invoice_data['invoice_number'] == 'INV-2024-001'
+    assert invoice_data['invoice_date'] == '2024-03-05'
+    assert invoice_data['total_amount'] == 1770.0
+
+def test_keeps_reading_until_a_labelled_total():
+    texts = [HEADER_PAGE, 'Hardware parts 2000.00\n', 'Total: 9500.00\n', 'Annexure 12.00\n', 'Annexure 13.00\n']
+    pages, state = counting_pages(texts)
+
+    invoice_data = extract_invoice_fields_from_pages(pages)
+
+    assert state['yielded'] == 3
+    assert invoice_data['total_amount'] == 9500.0
+
+def test_matches_full_text_extraction_of_pages_read():
+    texts = ['Hardware parts 2000.00\n', HEADER_PAGE, 'Amount Due: Rs. 4,500.00\n', 'Appendix 99999.00\n']
+    pages, state = counting_pages(texts)
+
+    invoice_data = extract_invoice_fields_from_pages(pages)
+    expected = extract_invoice_fields('\n'.join(texts[:state['yielded']]))
+
+    assert state['yielded'] == 3
+    for field in ('invoice_number', 'invoice_date', 'gstin', 'vendor_name', 'total_amount'):
+        assert invoice_data[field] == expected[field]
+    assert invoice_data['raw_text'] == expected['raw_text'].strip()
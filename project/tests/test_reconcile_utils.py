@@ -0,0 +1,174 @@
+import io
+import json
+import random
+import time
+
+import pandas as pd
+import pytest
+
+from app.utils.reconcile_utils import (
+    load_register, normalize_invoice_number, reconcile_invoices
+)
+
+GSTIN = '29ABCDE1234F1Z5'
+OTHER_GSTIN = '27PQRSX5678K1Z2'
+
+def make_register(rows):
+    """Build a canonical register from (gstin, invoice_number, date, amount) tuples"""
+    frame = pd.DataFrame(rows, columns=['gstin', 'invoice_number', 'invoice_date', 'amount'])
+    buffer = io.StringIO(frame.to_csv(index=False))
+    return load_register(buffer, 'csv')
+
+def make_invoice(number, amount, date='15/04/2024', gstin=GSTIN):
+    return {
+        'filename': f'{number}.pdf',
+        'invoice_data': {
+            'gstin': gstin,
+            'invoice_number': number,
+            'invoice_date': date,
+            'total_amount': amount
+        }
+    }
+
+def test_normalize_invoice_number():
+    assert normalize_invoice_number('inv/0042') == normalize_invoice_number('INV-42')
+    assert normalize_invoice_number('INV 42') == normalize_invoice_number('inv42')
+    assert normalize_invoice_number('2024/042') == normalize_invoice_number('2024/42')
+    assert normalize_invoice_number('2024/042') != normalize_invoice_number('20242')
+    assert normalize_invoice_number('INV-000') == 'INV-0'
+    assert normalize_invoice_number(None) == ''
+    assert normalize_invoice_number(float('nan')) == ''
+
+def test_load_csv_with_aliases():
+    csv = (
+        'Supplier GSTIN,Bill No,Bill Date,Invoice Value,Party Name\n'
+        '29abcde1234f1z5 ,INV/0042,15/04/2024,"1,180.00",Acme Traders\n'
+    )
+    df = load_register(io.StringIO(csv), 'csv')
+    row = df.iloc[0]
+    assert row['gstin'] == GSTIN
+    assert row['invoice_key'] == 'INV-42'
+    assert row['invoice_date'] == '2024-04-15'
+    assert row['amount'] == 1180.0
+    assert row['vendor_name'] == 'Acme Traders'
+
+def test_load_gstr2b_json():
+    payload = {'data': {'docdata': {'b2b': [{
+        'ctin': GSTIN,
+        'trdnm': 'Acme Traders',
+        'inv': [
+            {'inum': 'INV-1', 'dt': '01-04-2024', 'val': 500},
+            {'inum': 'INV-2', 'dt': '02-04-2024', 'val': 750.5}
+        ]
+    }]}}}
+    df = load_register(io.StringIO(json.dumps(payload)), 'json')
+    assert list(df['invoice_key']) == ['INV-1', 'INV-2']
+    assert list(df['amount']) == [500.0, 750.5]
+    assert list(df['invoice_date']) == ['2024-04-01', '2024-04-02']
+    assert set(df['vendor_name']) == {'Acme Traders'}
+
+def test_load_iso_and_day_first_dates():
+    csv = (
+        'gstin,invoice_number,invoice_date,amount\n'
+        f'{GSTIN},A-1,2024-03-05,100\n'
+        f'{GSTIN},A-2,2024-03-05 00:00:00,100\n'
+        f'{GSTIN},A-3,05/03/2024,100\n'
+        f'{GSTIN},A-4,05-03-24,100\n'
+        f'{GSTIN},A-5,5 Mar 2024,100\n'
+        f'{GSTIN},A-6,not a date,100\n'
+    )
+    df = load_register(io.StringIO(csv), 'csv')
+    assert list(df['invoice_date']) == ['2024-03-05'] * 5 + ['']
+
+def test_excel_dates_are_not_swapped(tmp_path):
+    pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'register.xlsx')
+    pd.DataFrame({
+        'GSTIN': [GSTIN],
+        'Invoice No': ['INV-42'],
+        'Invoice Date': [pd.Timestamp('2024-03-05')],
+        'Amount': [1180]
+    }).to_excel(path, index=False)
+
+    register = load_register(path)
+    assert register['invoice_date'][0] == '2024-03-05'
+
+    report = reconcile_invoices([make_invoice('INV-42', 1180, date='05/03/2024')], register)
+    assert report['summary']['matched'] == 1
+
+def test_iso_register_date_matches_day_first_invoice():
+    register = make_register([(GSTIN, 'INV-42', '2024-03-05', 1180), (GSTIN, 'INV-43', '2024-03-06 00:00:00', 900)])
+    report = reconcile_invoices([make_invoice('INV-42', 1180, date='05/03/2024'),
+                                 make_invoice('INV-99', 900, date='06/03/2024')], register)
+
+    assert report['summary']['matched'] == 1
+    # The fuzzy match passes the date window, so only the misread number differs
+    assert report['mismatched'][0]['differences'] == ['invoice_number']
+
+def test_exact_match_and_missing_rows():
+    register = make_register([
+        (GSTIN, 'INV-0042', '15/04/2024', 1180),
+        (GSTIN, 'INV-43', '16/04/2024', 900)
+    ])
+    report = reconcile_invoices([make_invoice('inv/42', 1180), make_invoice('INV-99', 5000, gstin=OTHER_GSTIN)],
+                                register)
+
+    assert report['summary']['matched'] == 1
+    assert report['matched'][0]['match_type'] == 'exact'
+    assert [inv['invoice_number'] for inv in report['missing_in_register']] == ['INV-99']
+    assert [row['invoice_number'] for row in report['missing_in_invoices']] == ['INV-43']
+
+def test_amount_outside_tolerance_is_mismatched():
+    register = make_register([(GSTIN, 'INV-42', '15/04/2024', 1180)])
+    report = reconcile_invoices([make_invoice('INV-42', 1300)], register)
+
+    assert report['summary']['mismatched'] == 1
+    assert report['mismatched'][0]['differences'] == ['amount']
+
+def test_fuzzy_match_keeps_misread_field_as_difference():
+    register = make_register([
+        (GSTIN, 'INV-42', '15/04/2024', 1180),
+        (GSTIN, 'INV-43', '15/04/2024', 2500)
+    ])
+    # Invoice number misread by OCR: matched on GSTIN and amount, but not a clean match
+    report = reconcile_invoices([make_invoice('INV-47', 1180.4)], register)
+
+    assert report['summary']['matched'] == 0
+    entry = report['mismatched'][0]
+    assert entry['match_type'] == 'fuzzy_gstin'
+    assert entry['register']['invoice_number'] == 'INV-42'
+    assert entry['differences'] == ['invoice_number']
+
+def test_fuzzy_number_match_reports_gstin():
+    register = make_register([(GSTIN, 'INV-42', '15/04/2024', 1180)])
+    report = reconcile_invoices([make_invoice('INV-42', 1180, gstin=OTHER_GSTIN)], register)
+
+    entry = report['mismatched'][0]
+    assert entry['match_type'] == 'fuzzy_number'
+    assert entry['differences'] == ['gstin']
+
+def test_fuzzy_picks_closest_unused_amount_within_dates():
+    register = make_register([
+        (GSTIN, 'A-1', '15/04/2024', 1000),
+        (GSTIN, 'A-2', '15/04/2024', 1004),
+        (GSTIN, 'A-3', '30/05/2024', 1002)
+    ])
+    report = reconcile_invoices([make_invoice('X-1', 1003), make_invoice('X-2', 1003)], register)
+
+    picked = [entry['register']['invoice_number'] for entry in report['mismatched']]
+    # A-3 is closest in amount but outside the date tolerance; each row is used once
+    assert picked == ['A-2', 'A-1']
+    assert [row['invoice_number'] for row in report['missing_in_invoices']] == ['A-3']
+
+def test_fuzzy_matching_large_register_is_fast():
+    rng = random.Random(7)
+    rows = [(GSTIN, f'R-{i}', '15/04/2024', round(rng.uniform(100, 100000), 2)) for i in range(100000)]
+    register = make_register(rows)
+    invoices = [make_invoice(f'X-{i}', rows[i * 50][3]) for i in range(2000)]
+
+    started = time.monotonic()
+    report = reconcile_invoices(invoices, register)
+    elapsed = time.monotonic() - started
+
+    assert report['summary']['matched'] + report['summary']['mismatched'] == 2000
+    assert elapsed < 5
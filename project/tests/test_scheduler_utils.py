@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.scheduler_utils import FairScheduler, SchedulerRejected
+
+def acquire_in_thread(scheduler, tenant, lane='interactive', timeout=None):
+    """Start acquire() in a thread, returning (thread, result dict)"""
+    result = {}
+
+    def run():
+        try:
+            result['ticket'] = scheduler.acquire(tenant, lane, timeout=timeout)
+        except SchedulerRejected as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, result
+
+def test_bulk_never_takes_reserved_interactive_slot():
+    scheduler = FairScheduler(max_workers=2, interactive_reserved=1, tenant_concurrency=5)
+    first = scheduler.acquire('bulk-client', 'bulk')
+
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire('bulk-client', 'bulk', timeout=0.1)
+
+    # The reserved slot is still free for an interactive upload from anyone
+    interactive = scheduler.acquire('someone', 'interactive', timeout=0.1)
+    assert interactive.granted
+    scheduler.release(interactive)
+    scheduler.release(first)
+
+def test_queued_job_times_out_and_is_counted():
+    scheduler = FairScheduler(max_workers=1, interactive_reserved=0, tenant_concurrency=1)
+    running = scheduler.acquire('a')
+
+    started = time.monotonic()
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire('a', timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+
+    metrics = scheduler.metrics()
+    assert metrics['totals']['rejected'] == 1
+    assert metrics['lanes']['interactive']['queued'] == 0
+    scheduler.release(running)
+
+def test_waiting_job_is_granted_on_release():
+    scheduler = FairScheduler(max_workers=1, interactive_reserved=0, tenant_concurrency=1)
+    running = scheduler.acquire('a')
+    thread, result = acquire_in_thread(scheduler, 'b', timeout=2)
+    time.sleep(0.05)
+    assert 'ticket' not in result
+
+    scheduler.release(running)
+    thread.join(1)
+    assert result['ticket'].granted
+    assert result['ticket'].wait_seconds > 0
+    scheduler.release(result['ticket'])
+
+def test_rate_limit_spaces_out_jobs():
+    scheduler = FairScheduler(max_workers=4, interactive_reserved=0, tenant_concurrency=4,
+                              tenant_rate=20.0, tenant_burst=1)
+    scheduler.release(scheduler.acquire('a'))
+
+    # The bucket is empty: the next job waits for a token (1 / 20 s)
+    started = time.monotonic()
+    scheduler.release(scheduler.acquire('a', timeout=1))
+    assert time.monotonic() - started >= 0.04
+
+    # Other tenants have their own bucket
+    started = time.monotonic()
+    scheduler.release(scheduler.acquire('b', timeout=1))
+    assert time.monotonic() - started < 0.04
+
+def test_tenant_concurrency_and_overrides():
+    scheduler = FairScheduler(max_workers=4, interactive_reserved=0, tenant_concurrency=1,
+                              tenant_concurrency_overrides={'anonymous': 3})
+    tickets = [scheduler.acquire('anonymous', timeout=0.1) for _ in range(3)]
+    single = scheduler.acquire('a', timeout=0.1)
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire('a', timeout=0.05)
+    for ticket in tickets + [single]:
+        scheduler.release(ticket)
+
+def test_idle_tenants_are_dropped():
+    scheduler = FairScheduler(max_workers=2, interactive_reserved=0)
+    for index in range(100):
+        scheduler.release(scheduler.acquire(f'tenant-{index}'))
+
+    assert scheduler.metrics()['tenants'] == {}
+    assert scheduler.metrics()['totals']['completed'] == 100
+
+def test_rate_limited_tenant_is_kept_until_its_bucket_refills():
+    scheduler = FairScheduler(max_workers=2, interactive_reserved=0, tenant_rate=1.0, tenant_burst=1)
+    scheduler.release(scheduler.acquire('a'))
+    assert 'a' in scheduler.metrics()['tenants']
+
+    # Dropping the state now would hand the tenant a full bucket again
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire('a', timeout=0.1)
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from app.utils.search_utils import SearchIndex
+
+def make_result(number, date, text='', amount=100.0):
+    return {
+        'filename': f'{number}.pdf',
+        'raw_text': text,
+        'invoice_data': {
+            'invoice_number': number,
+            'invoice_date': date,
+            'gstin': '29ABCDE1234F1Z5',
+            'vendor_name': 'Acme Traders',
+            'total_amount': amount
+        },
+        'tax_data': {}
+    }
+
+def collect(index, **filters):
+    """Follow next_cursor through every page, returning invoice numbers in order"""
+    numbers, cursor = [], None
+    while True:
+        page = index.search(cursor=cursor, per_page=3, **filters)
+        numbers += [row['invoice_number'] for row in page['results']]
+        cursor = page['next_cursor']
+        if not page['has_more']:
+            assert cursor is None
+            return numbers
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / 'search.db'))
+
+def test_keyset_pages_cover_every_row_newest_first(index):
+    index.add_result(make_result('A', '05/01/2024'))
+    index.add_result(make_result('B', '2024-03-01'))
+    index.add_result(make_result('C', 'unreadable'))
+    index.add_result(make_result('D', '05/01/2024'))
+    index.add_result(make_result('E', '31/12/2023'))
+    index.add_result(make_result('F', ''))
+    index.add_result(make_result('G', '10-02-24'))
+
+    # Undated rows come after every dated row
+    assert collect(index) == ['B', 'G', 'D', 'A', 'E', 'F', 'C']
+
+def test_date_filters_use_normalized_dates(index):
+    index.add_result(make_result('A', '05/01/2024'))
+    index.add_result(make_result('B', '2024-03-01'))
+    index.add_result(make_result('C', '2024-13-45'))
+    index.add_result(make_result('D', '31/12/2023'))
+
+    assert collect(index, date_from='01/01/2024') == ['B', 'A']
+    assert collect(index, date_from='2024-01-01', date_to='2024-02-01') == ['A']
+    with pytest.raises(ValueError):
+        index.search(date_from='not a date')
+
+def test_text_search_pages_by_rank(index):
+    for i in range(7):
+        index.add_result(make_result(f'T{i}', '01/01/2024', text='consulting ' * (i + 1)))
+    index.add_result(make_result('X', '01/01/2024', text='hardware'))
+
+    numbers = collect(index, query='consult')
+    assert sorted(numbers) == [f'T{i}' for i in range(7)]
+    assert len(set(numbers)) == 7
+
+def test_cursor_from_another_ordering_is_rejected(index):
+    index.add_result(make_result('A', '05/01/2024', text='consulting'))
+    index.add_result(make_result('B', '06/01/2024', text='consulting'))
+    cursor = index.search(per_page=1)['next_cursor']
+
+    with pytest.raises(ValueError):
+        index.search(query='consulting', cursor=cursor)
+    with pytest.raises(ValueError):
+        index.search(cursor='garbage')
+
+def test_existing_index_gets_invoice_day_backfilled(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE invoices (
+            id INTEGER PRIMARY KEY, filename TEXT NOT NULL, invoice_number TEXT, invoice_date TEXT,
+            gstin TEXT, vendor_name TEXT, total_amount REAL, predicted_total REAL, indexed_at REAL NOT NULL
+        );
+        CREATE INDEX invoices_date ON invoices(invoice_date);
+        INSERT INTO invoices VALUES (1, 'a.pdf', 'A', '05/01/2024', '', '', 0, 0, 0);
+        INSERT INTO invoices VALUES (2, 'b.pdf', 'B', 'garbled', '', '', 0, 0, 0);
+    ''')
+    conn.commit()
+    conn.close()
+
+    index = SearchIndex(path)
+    assert collect(index, date_from='2024-01-01') == ['A']
+    assert collect(index) == ['A', 'B']
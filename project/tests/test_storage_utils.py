@@ -0,0 +1,96 @@
+import gzip
+import io
+import os
+import time
+
+import pytest
+
+from app.utils.storage_utils import ContentStore
+
+def object_files(store):
+    """Every stored object file under the store root"""
+    found = []
+    for directory, _, files in os.walk(os.path.join(store.root, 'objects')):
+        found += [os.path.join(directory, name) for name in files]
+    return found
+
+def refcount(store, digest):
+    row = store._conn.execute('SELECT refcount FROM objects WHERE digest = ?', (digest,)).fetchone()
+    return row[0] if row else None
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / 'uploads'))
+
+def test_duplicate_put_stores_one_object(store):
+    first = store.put(io.BytesIO(b'invoice bytes'), 'a.png')
+    second = store.put(io.BytesIO(b'invoice bytes'), 'b.png')
+
+    assert first == second
+    assert len(object_files(store)) == 1
+    assert refcount(store, first) == 2
+    assert store.stats()['references'] == 2
+    assert store.stats()['unique_bytes'] == len(b'invoice bytes')
+
+def test_reputting_a_name_moves_its_reference(store):
+    old = store.put(io.BytesIO(b'first version'), 'a.png')
+    assert store.put(io.BytesIO(b'first version'), 'a.png') == old
+    assert refcount(store, old) == 1
+
+    new = store.put(io.BytesIO(b'second version'), 'a.png')
+
+    assert store.digest_for('a.png') == new
+    assert refcount(store, new) == 1
+    # The replaced content had no other reference, so it is gone
+    assert refcount(store, old) is None
+    assert len(object_files(store)) == 1
+
+def test_release_deletes_object_only_at_zero_refs(store):
+    digest = store.put(io.BytesIO(b'shared'), 'a.png')
+    store.put(io.BytesIO(b'shared'), 'b.png')
+
+    assert store.release('a.png')
+    assert not store.exists('a.png')
+    assert refcount(store, digest) == 1
+    assert len(object_files(store)) == 1
+
+    assert store.release('b.png')
+    assert refcount(store, digest) is None
+    assert object_files(store) == []
+    assert not store.release('b.png')
+
+def test_sweep_expires_only_old_refs_of_the_kind(store):
+    store.put(io.BytesIO(b'old upload'), 'old.png')
+    store.put(io.BytesIO(b'new upload'), 'new.png')
+    store.put(io.BytesIO(b'old export'), 'old.xlsx', kind='export')
+    long_ago = time.time() - 100 * 24 * 60 * 60
+    store._conn.execute('UPDATE refs SET created_at = ? WHERE name IN (?, ?)', (long_ago, 'old.png', 'old.xlsx'))
+    store._conn.commit()
+
+    result = store.sweep({'upload': 90, 'export': None})
+
+    assert result == {'expired_refs': 1, 'deleted_objects': 1}
+    assert not store.exists('old.png')
+    assert store.exists('new.png')
+    assert store.exists('old.xlsx')
+    assert len(object_files(store)) == 2
+
+def test_compressed_object_is_materialized_as_a_private_copy(tmp_path):
+    store = ContentStore(str(tmp_path / 'uploads'), compress=True)
+    content = b'%PDF-1.4 ' + b'invoice ' * 1000
+    store.put(io.BytesIO(content), 'a.pdf')
+
+    stored, = object_files(store)
+    assert stored.endswith('.pdf.gz')
+    with gzip.open(stored, 'rb') as f:
+        assert f.read() == content
+
+    with store.materialize('a.pdf') as path:
+        assert path != stored
+        with open(path, 'rb') as f:
+            assert f.read() == content
+    assert not os.path.exists(path)
+
+    with pytest.raises(FileNotFoundError):
+        with store.materialize('missing.pdf'):
+            pass